@@ -1,8 +1,9 @@
 import argparse
 import itertools
-from collections.abc import Iterable
+from collections.abc import Iterable, Iterator
+from functools import cache
 from pathlib import Path
-from typing import Any
+from typing import Any, NamedTuple
 
 from tabulate import tabulate
 
@@ -67,16 +68,26 @@ MAX_RESERVED_STATE = 4
 
 # '*' if the head is there, '-' if it's not there.
 HEAD_ALPHABET = ['-', '*']
+# the same as bytes, because heads are handled as bytes internally
+DASH = ord('-')
+STAR = ord('*')
 
 # info about the directions heads can move in specific states
 MoveInfo = tuple[int | EndStates, tuple[Directions]]
 
 # original state (not including endstates), incomplete char saves
 ReadingStageInfo = tuple[int, str]
-# original state (including endstates), saved chars, directions
-WritingStageInfo = TransitionOut
-# original state (including endstates), list of directions, whether we found a header or not
-MovingStageInfo = tuple[int | EndStates, tuple[Directions], tuple[bool]]
+
+
+class WritingStageInfo(NamedTuple):
+    """Hashable version of a transition output: original state (including endstates), saved chars and directions."""
+
+    state: int | EndStates
+    chars_and_dirs: tuple[tuple[Char, Directions]]
+
+
+# original state (including endstates), list of directions, on which tapes we found a header (bit i is tape i)
+MovingStageInfo = tuple[int | EndStates, tuple[Directions], int]
 
 
 ################################################################
@@ -84,15 +95,21 @@ MovingStageInfo = tuple[int | EndStates, tuple[Directions], tuple[bool]]
 ################################################################
 
 
+@cache
+def split_chars_and_dirs(chars_and_dirs: tuple[tuple[Char, Directions]]) -> tuple[tuple[Char], tuple[Directions]]:
+    """Separates the written chars from the directions. Cached, because the same outputs are split over and over again."""
+
+    chars, dirs = zip(*chars_and_dirs)
+    return chars, dirs
+
+
 def extract_moves(trans_fun: TransitionFunction) -> set[MoveInfo]:
     """Extracts all possible (state, directions)-vectors from the transition function."""
 
     moves: set[MoveInfo] = set()
-    for t_in, t_out in trans_fun._transitions.items():
-        state_in, chars_in = t_in
-        state_out, chars_and_dirs_out = t_out
-        chars_out, dirs_out = zip(*chars_and_dirs_out)
-        moves.add((state_out, tuple(dirs_out)))
+    for state_out, chars_and_dirs_out in trans_fun._transitions.values():
+        _, dirs_out = split_chars_and_dirs(tuple(chars_and_dirs_out))
+        moves.add((state_out, dirs_out))
     return moves
 
 
@@ -100,21 +117,15 @@ def extract_trans_ins(trans_fun: TransitionFunction) -> list[TransitionIn]:
     return list(trans_fun._transitions.keys())
 
 
-def extract_trans_outs(trans_fun: TransitionFunction) -> set[TransitionOut]:
-    return set([(state_out, tuple(chars_and_dirs_out)) for state_out, chars_and_dirs_out in trans_fun._transitions.values()])
+def canonicalize(trans_out: TransitionOut) -> WritingStageInfo:
+    """Builds the key for the writing states from a transition output (which might contain a list)."""
 
+    state_out, chars_and_dirs_out = trans_out
+    return WritingStageInfo(state_out, tuple(chars_and_dirs_out))
 
-def extract_non_end_states(transitions: list[tuple[TransitionIn, TransitionOut]]) -> set[int | EndStates]:
-    states: set[int | EndStates] = set()
-    for t_in, t_out in transitions:
-        state_in, chars_in = t_in
-        state_out, chars_and_dirs_out = t_out
-        chars_out, dirs_out = zip(*chars_and_dirs_out)
-        if not is_endstate(state_in):
-            states.add(state_in)
-        if not is_endstate(state_out):
-            states.add(state_out)
-    return states
+
+def extract_trans_outs(trans_fun: TransitionFunction) -> set[WritingStageInfo]:
+    return set(canonicalize(trans_out) for trans_out in trans_fun._transitions.values())
 
 
 ################################################################
@@ -122,16 +133,32 @@ def extract_non_end_states(transitions: list[tuple[TransitionIn, TransitionOut]]
 ################################################################
 
 
-def possible_found_vectors(directions: tuple[Directions], going: Directions) -> Iterable[tuple[bool]]:
-    """Returns the possibilities in which the headers in the direction we're going can be found.
+# found heads are bitmasks (bit i is tape i)
+NO_HEADS_FOUND = 0
+
 
-    Example: LRLNR, Directions.R -> [00000,01000,00001,01001]"""
+@cache
+def possible_found_vectors(directions: tuple[Directions], going: Directions) -> tuple[int]:
+    """Returns the possibilities in which the headers in the direction we're going can be found (as bitmasks, bit i is tape i).
 
-    found_possibilities = [[True, False] if direction == going else [False] for direction in directions]
-    return itertools.product(*found_possibilities)
+    Example: LRLNR, Directions.R -> [0b10010, 0b00010, 0b10000, 0b00000]"""
 
+    found_possibilities = [(1 << i, 0) if direction == going else (0,) for i, direction in enumerate(directions)]
+    return tuple(sum(found_bits) for found_bits in itertools.product(*found_possibilities))
 
-def generate_possible_moves(original_moves: set[MoveInfo]) -> tuple[set[MoveInfo], set[MoveInfo]]:
+
+# the heads going right are already moved when going left
+RIGHT_FOUND = {Directions.L: Directions.L, Directions.N: Directions.N, Directions.R: Directions.N}
+
+
+@cache
+def without_right(directions: tuple[Directions]) -> tuple[Directions]:
+    """Replaces every `Directions.R` with `Directions.N` (cached, because every directions vector is translated multiple times)."""
+
+    return tuple(RIGHT_FOUND[direction] for direction in directions)
+
+
+def generate_possible_moves(original_moves: frozenset[MoveInfo]) -> tuple[frozenset[MoveInfo], frozenset[MoveInfo]]:
     """Generates all the possible ways, in which order the headers in the tapes can be found. Output format: (right, left)
 
     Takes the set of original directions vectors and computes for that:
@@ -141,17 +168,16 @@ def generate_possible_moves(original_moves: set[MoveInfo]) -> tuple[set[MoveInfo
     Example: [0, LRLNR] -> [(0, LRLNR), (0, LRLNN), (0, LNNLNR), (0, LNLNN)], [(0, LNLNN), (0, LNNNN), (0, NNLNN), (0, NNNNN)]"""
 
     # first compute all the possible ways the headers can be found going right
-    possibilities_right: set[MoveInfo] = original_moves
+    possibilities_right: frozenset[MoveInfo] = original_moves
 
     # now computer all ways the headers can be found going left
     # note that we already found all the headers that have to be moved right
     possibilities_left: set[tuple[Directions]] = set()
     for state_out, directions in original_moves:
         # we found every Directions.R
-        new_directions = tuple([Directions.N if direction == Directions.R else direction for direction in directions])
-        possibilities_left.add((state_out, new_directions))
+        possibilities_left.add((state_out, without_right(directions)))
 
-    return possibilities_right, possibilities_left
+    return possibilities_right, frozenset(possibilities_left)
 
 
 ################################################################
@@ -159,18 +185,62 @@ def generate_possible_moves(original_moves: set[MoveInfo]) -> tuple[set[MoveInfo
 ################################################################
 
 
-def compress_alphabet(original_input_alphabet: list[Char], n_tapes: int) -> tuple[list[Char], list[Char]]:
+def compress_alphabet(original_input_alphabet: tuple[Char], n_tapes: int) -> tuple[tuple[Char], tuple[Char]]:
     """Compresses all possible combinations of headers and chars into one compressed char each.
 
-    Returns a list of compressed start chars and a list of compressed non-start chars."""
+    Returns a tuple of compressed start chars and a tuple of compressed non-start chars."""
 
     # first add all the possible combinations of chars without the start symbol ('S')
-    compressed_non_start = ["".join(chars) for chars in itertools.product(HEAD_ALPHABET, original_input_alphabet + ['_'], repeat=n_tapes)]
+    compressed_non_start = tuple("".join(chars) for chars in itertools.product(HEAD_ALPHABET, original_input_alphabet + ('_',), repeat=n_tapes))
     # start symbol can only be in one position
-    compressed_start = ["".join(chars) for chars in itertools.product(HEAD_ALPHABET, ['S'], repeat=n_tapes)]
+    compressed_start = tuple("".join(chars) for chars in itertools.product(HEAD_ALPHABET, ['S'], repeat=n_tapes))
     return compressed_start, compressed_non_start
 
 
+@cache
+def split_compressed(compressed_char: Char) -> tuple[bytes, str]:
+    """Splits a compressed char into the head flags (as bytes) and the chars on the tapes, so helpers don't have to skip every 2nd char.
+
+    Example: '*a-b*c' -> (b'*-*', 'abc')"""
+
+    return compressed_char[0::2].encode('ascii'), compressed_char[1::2]
+
+
+@cache
+def head_bits(heads: bytes) -> int:
+    """Returns the tapes that have a head in this cell as a bitmask (bit i is tape i).
+
+    Example: b'*-*' -> 0b101"""
+
+    return sum(1 << i for i, head in enumerate(heads) if head == STAR)
+
+
+def split_alphabet(compressed_alphabet: tuple[Char]) -> tuple[tuple[Char, bytes, str, int]]:
+    """Splits every compressed char once: (compressed char, head flags, chars on the tapes, head bitmask)."""
+
+    split_chars: list[tuple[Char, bytes, str, int]] = []
+    for compressed_char in compressed_alphabet:
+        heads, chars = split_compressed(compressed_char)
+        split_chars.append((compressed_char, heads, chars, head_bits(heads)))
+    return tuple(split_chars)
+
+
+@cache
+def join_compressed(heads: bytes, chars: str) -> Char:
+    """Inverse of `split_compressed`.
+
+    Example: (b'*-*', 'abc') -> '*a-b*c'"""
+
+    return "".join(head + char for head, char in zip(heads.decode('ascii'), chars))
+
+
+@cache
+def nothing_saved(n_tapes: int) -> str:
+    """Returns the saved chars where no chars were saved yet (always the same object for the same number of tapes)."""
+
+    return ' ' * n_tapes
+
+
 def chars_apply_found(chars: tuple[Char], found_vector: list[bool]) -> str:
     # make it mutable
     new_chars = list(chars)
@@ -182,7 +252,7 @@ def chars_apply_found(chars: tuple[Char], found_vector: list[bool]) -> str:
     return "".join(new_chars)
 
 
-def generate_incomplete_saves(original_trans_in: list[TransitionIn], n_tapes: int) -> set[tuple[int, str]]:
+def generate_incomplete_saves(original_trans_in: tuple[TransitionIn], n_tapes: int) -> frozenset[tuple[int, str]]:
     """Chars can be read in an arbitrary order. So missing chars have to be considered.
 
     Example: ['01'] -> [' ', ' 1', '0 ', '01']"""
@@ -195,7 +265,7 @@ def generate_incomplete_saves(original_trans_in: list[TransitionIn], n_tapes: in
             # add every possibility of found / not found chars
             incomplete_save = chars_apply_found(chars_in, found_vector)
             saves.add((state_in, incomplete_save))
-    return saves
+    return frozenset(saves)
 
 
 ################################################################
@@ -215,7 +285,7 @@ def compress_states_copying(original_alphabet: list[Char], start_at: int) -> tup
     return compressed_states_map, next_state
 
 
-def compress_states_reading(incomplete_saves: set[tuple[int, str]], start_at: int) -> tuple[dict[ReadingStageInfo, int], int]:
+def compress_states_reading(incomplete_saves: frozenset[tuple[int, str]], start_at: int) -> tuple[dict[ReadingStageInfo, int], int]:
     """Builds a bidirectional dictionary that maps from every occuring combination of original state and saved chars to one compressed state each.
     (original state, saved chars) -> compressed state
 
@@ -235,7 +305,7 @@ def compress_states_reading(incomplete_saves: set[tuple[int, str]], start_at: in
     return compressed_states_map, next_state
 
 
-def compress_states_writing(original_trans_outs: set[TransitionOut], start_at: int) -> tuple[dict[WritingStageInfo, int], int]:
+def compress_states_writing(original_trans_outs: set[WritingStageInfo], start_at: int) -> tuple[dict[WritingStageInfo, int], int]:
     """Builds a bidirectional dictionary that maps from every combination of original state and finished saved chars to one compressed state each.
     (original state, write vector) -> compressed state
 
@@ -254,7 +324,7 @@ def compress_states_writing(original_trans_outs: set[TransitionOut], start_at: i
     return compressed_states_map, next_state
 
 
-def compress_states_moving(possible_moves: set[MoveInfo], going: Directions, start_at: int) -> tuple[dict[MovingStageInfo, int], int]:
+def compress_states_moving(possible_moves: frozenset[MoveInfo], going: Directions, start_at: int) -> tuple[dict[MovingStageInfo, int], int]:
     """Builds a bidirectional dictionary that maps from every combination of original state and list of directions to one compressed state each.
     (original state, directions, header found) -> compressed state
 
@@ -293,10 +363,15 @@ def compress_states_cleanup(original_alphabet: list[Char], start_at: int) -> tup
 # BUILD TRANSITIONS
 ################################################################
 
+@cache
+def transition_out(state_out: int | EndStates, char_out: Char, direction: Directions) -> TransitionOut:
+    """Builds the output of a transition (outputs are shared between all transitions that do the same thing)."""
+
+    return state_out, ((char_out, direction),)
+
+
 def build_transition(state_in: int, char_in: Char, state_out: int | EndStates, char_out: Char, direction: Directions) -> tuple[TransitionIn, TransitionOut]:
-    t_in = (state_in, [char_in])
-    t_out = (state_out, [(char_out, direction)])
-    return t_in, t_out
+    return (state_in, (char_in,)), transition_out(state_out, char_out, direction)
 
 
 ################################################################
@@ -304,9 +379,7 @@ def build_transition(state_in: int, char_in: Char, state_out: int | EndStates, c
 ################################################################
 
 
-def build_transitions_stage_zero(original_alphabet: list[Char], compressed_states_map_copying: dict[Char, int], n_tapes: int) -> list[tuple[TransitionIn, TransitionOut]]:
-    compressed_transitions: list[tuple[TransitionIn, TransitionOut]] = []
-
+def build_transitions_stage_zero(original_alphabet: list[Char], compressed_states_map_copying: dict[Char, int], n_tapes: int) -> Iterator[tuple[TransitionIn, TransitionOut]]:
     # add an artificial start symbol (-S-S-S)
     compressed_start_char = "-S" * n_tapes
     # first cell needs to have heads everywhere
@@ -315,33 +388,33 @@ def build_transitions_stage_zero(original_alphabet: list[Char], compressed_state
     init_multichar_without_heads = lambda original_char: '-' + original_char + '-_' * (n_tapes - 1)
 
     # cover empty inputs
-    compressed_transitions.append(build_transition(
+    yield build_transition(
         state_in=STATE_START,
         char_in='_',
         state_out=STATE_BLANK_INPUT,
         char_out=compressed_start_char,
         direction=Directions.R
-    ))
-    compressed_transitions.append(build_transition(
+    )
+    yield build_transition(
         state_in=STATE_BLANK_INPUT,
         char_in='_',
         state_out=STATE_READY,
         char_out=init_multichar_with_heads('_'),
         direction=Directions.N
-    ))
+    )
 
     # whatever char there is on the first cell, remember it and put the artificial start symbol there
     for replaced_char in original_alphabet:
         # remember the replaced char in a state, remember that we haven't placed the first char yet
         state_out = compressed_states_map_copying[replaced_char, False]
         # replace it with the atificial start symbol and go right
-        compressed_transitions.append(build_transition(
+        yield build_transition(
             state_in=STATE_START,
             char_in=replaced_char,
             state_out=state_out,
             char_out=compressed_start_char,
             direction=Directions.R
-        ))
+        )
 
     # now shift the first char 1 to the right
     for second_char in original_alphabet:
@@ -353,13 +426,13 @@ def build_transitions_stage_zero(original_alphabet: list[Char], compressed_state
             # we can just write the compressed char immediately
             compressed_char = init_multichar_with_heads(first_char)
             # replace it with the last remembered char and go next
-            compressed_transitions.append(build_transition(
+            yield build_transition(
                 state_in=state_in,
                 char_in=second_char,
                 state_out=state_out,
                 char_out=compressed_char,
                 direction=Directions.R
-            ))
+            )
 
     # now shift all the rest 1 to the right
     for replaced_char in original_alphabet:
@@ -371,13 +444,13 @@ def build_transitions_stage_zero(original_alphabet: list[Char], compressed_state
             # we can just write the compressed char immediately
             compressed_char = init_multichar_without_heads(prev_char)
             # replace it with the last remembered char and go next
-            compressed_transitions.append(build_transition(
+            yield build_transition(
                 state_in=state_in,
                 char_in=replaced_char,
                 state_out=state_out,
                 char_out=compressed_char,
                 direction=Directions.R
-            ))
+            )
 
     # if we find the end / blank ('_'), write down the last char and go back
     for last_char in original_alphabet:
@@ -387,36 +460,34 @@ def build_transitions_stage_zero(original_alphabet: list[Char], compressed_state
             state_in = compressed_states_map_copying[last_char, placed_first]
             # we can just write the compressed char immediately
             compressed_char = init_multichar_without_heads(last_char) if placed_first else init_multichar_with_heads(last_char)
-            compressed_transitions.append(build_transition(
+            yield build_transition(
                 state_in=state_in,
                 char_in='_',
                 state_out=STATE_INIT_GO_LEFT,
                 char_out=compressed_char,
                 direction=Directions.L
-            ))
+            )
 
     # now go back, doesn't matter what's on the tape
     for original_char in original_alphabet:
         for placed_first in [True, False]:
             compressed_char = init_multichar_without_heads(original_char) if placed_first else init_multichar_with_heads(original_char)
-            compressed_transitions.append(build_transition(
+            yield build_transition(
                 state_in=STATE_INIT_GO_LEFT,
                 char_in=compressed_char,
                 state_out=STATE_INIT_GO_LEFT,
                 char_out=compressed_char,
                 direction=Directions.L
-            ))
+            )
 
     # if we find the artificial start symbol again, go into the ready state and place header on the first real cell
-    compressed_transitions.append(build_transition(
+    yield build_transition(
         state_in=1,
         char_in=compressed_start_char,
         state_out=STATE_READY,
         char_out=compressed_start_char,
         direction=Directions.R
-    ))
-
-    return compressed_transitions
+    )
 
 
 ################################################################
@@ -424,24 +495,21 @@ def build_transitions_stage_zero(original_alphabet: list[Char], compressed_state
 ################################################################
 
 
-def build_transitions_stage_zero_to_one(compressed_alphabet: list[Char], compressed_states_map_reading: dict[ReadingStageInfo, int], n_tapes: int) -> list[tuple[TransitionIn, TransitionOut]]:
-    compressed_transitions: list[tuple[TransitionIn, TransitionOut]] = []
+def build_transitions_stage_zero_to_one(compressed_alphabet: tuple[Char], compressed_states_map_reading: dict[ReadingStageInfo, int], n_tapes: int) -> Iterator[tuple[TransitionIn, TransitionOut]]:
     # we're in "compressed" state 0:
     # we haven't read anything yet. no matter what is on the tapes, go into the state where nothing is read yet.
+    # go into compressed state:
+    # original state is 0 and we haven't saved anything
+    state_out = compressed_states_map_reading[0, nothing_saved(n_tapes)]
     for char_in in compressed_alphabet:
-        # go into compressed state:
-        # original state is 0 and we haven't saved anything
-        state_out = compressed_states_map_reading[0, ' ' * n_tapes]
-        # add it to the list
         # don't write anything, don't move anything
-        compressed_transitions.append(build_transition(
+        yield build_transition(
             state_in=STATE_READY,
             char_in=char_in,
             state_out=state_out,
             char_out=char_in,
             direction=Directions.N
-        ))
-    return compressed_transitions
+        )
 
 
 ################################################################
@@ -449,67 +517,70 @@ def build_transitions_stage_zero_to_one(compressed_alphabet: list[Char], compres
 ################################################################
 
 
-def head_clash_reading(char_in: Char, saved_chars: str, n_tapes: int) -> bool:
-    """Returns `True` if we already saved a char on some tape, but then found another header."""
+def read_heads(heads: bytes, chars: str) -> str:
+    """Returns the chars under the heads in the same format as saved chars (' ' on tapes without a head)."""
+
+    return "".join(char if head == STAR else ' ' for head, char in zip(heads, chars))
+
+
+def saved_mask(saved_chars: str) -> int:
+    """Returns a bitmask with bit `i` set if we already saved a char for tape `i`."""
 
-    for i in range(n_tapes):
-        # every 2nd char in `char_in` indicates if the head is there
-        head_found = char_in[2 * i] == '*'
+    mask = 0
+    for i, saved_char in enumerate(saved_chars):
         # if the char read at position `i` isn't empty, we already found a char for that tape
-        char_found = saved_chars[i] != ' '
-        if head_found and char_found:
-            return True
-    return False
+        if saved_char != ' ':
+            mask |= 1 << i
+    return mask
 
 
-def save_new_chars(char_in: Char, old_saved_chars: str, n_tapes: int) -> str:
-    """Saves chars on tapes where a header is."""
+def save_new_chars(read_chars: str, old_saved_chars: str) -> str:
+    """Saves chars on tapes where a header is (the tapes of `read_chars` and `old_saved_chars` must not overlap)."""
 
-    # make a mutable representation
-    new_saved_chars = list(old_saved_chars)
-    for i in range(n_tapes):
-        # if we find a header on tape i
-        if char_in[2 * i] == '*':
-            # save the respective char on tape i
-            new_saved_chars[i] = char_in[2 * i + 1]
-    # make it immutable again
-    return "".join(new_saved_chars)
+    return "".join(old_char if read_char == ' ' else read_char for read_char, old_char in zip(read_chars, old_saved_chars))
 
 
-def build_transitions_stage_one(compressed_alphabet: list[Char], compressed_states_map_reading: dict[ReadingStageInfo, int], n_tapes: int) -> list[tuple[TransitionIn, TransitionOut]]:
-    compressed_transitions: list[tuple[TransitionIn, TransitionOut]] = []
+def build_transitions_stage_one(compressed_alphabet: tuple[Char], compressed_states_map_reading: dict[ReadingStageInfo, int], n_tapes: int) -> Iterator[tuple[TransitionIn, TransitionOut]]:
     # now add transitions for reading chars if there's the header there
-    incomplete_saves: Iterable[ReadingStageInfo] = compressed_states_map_reading.keys()
-    # we observe some chars
+    # group the saves by the tapes we already saved a char for, so clashes can be skipped for a whole group at once
+    # the compressed state of each save is looked up once here, not for every char we observe
+    saves_by_mask: dict[int, list[tuple[int, str, int]]] = {}
+    for (original_state_in, old_save), compressed_state_in in compressed_states_map_reading.items():
+        saves_by_mask.setdefault(saved_mask(old_save), []).append((original_state_in, old_save, compressed_state_in))
+    # only one dict probe per new save
+    lookup_reading_state = compressed_states_map_reading.get
+    # compressed chars that only differ on tapes without a head are read the same way, so the new save only has to be computed once for all of them
+    chars_by_reading: dict[str, list[Char]] = {}
     for char_in in compressed_alphabet:
+        chars_by_reading.setdefault(read_heads(*split_compressed(char_in)), []).append(char_in)
+    # we observe some chars
+    for read_chars, chars_in in chars_by_reading.items():
+        read_mask = saved_mask(read_chars)
         # and we already saved these chars
-        for original_state_in, old_save in incomplete_saves:
+        for mask, old_saves in saves_by_mask.items():
             # the header can only be at one position at the same time, so the following situation can't occur:
             # we observe a header and there's already a char read at that position
             # so we can just skip these cases
-            if head_clash_reading(char_in, old_save, n_tapes):
+            if read_mask & mask:
                 continue
-            # figure out which chars to save
-            new_save = save_new_chars(char_in, old_save, n_tapes)
-            # if the original TM doesn't want to read the input, don't read an incomplete version of it either
-            if (original_state_in, old_save) not in compressed_states_map_reading:
-                continue
-            if (original_state_in, new_save) not in compressed_states_map_reading:
-                continue
-            compressed_state_in = compressed_states_map_reading[original_state_in, old_save]
-            compressed_state_out = compressed_states_map_reading[original_state_in, new_save]
-            # construct transition
-            # no matter what state we're in, just keep it. we're just reading.
-            # connect old save to new save
-            # don't write anything, go right
-            compressed_transitions.append(build_transition(
-                state_in=compressed_state_in,
-                char_in=char_in,
-                state_out=compressed_state_out,
-                char_out=char_in,
-                direction=Directions.R
-            ))
-    return compressed_transitions
+            for original_state_in, old_save, compressed_state_in in old_saves:
+                # figure out which chars to save
+                new_save = save_new_chars(read_chars, old_save)
+                compressed_state_out = lookup_reading_state((original_state_in, new_save))
+                # if the original TM doesn't want to read the input, don't read an incomplete version of it either
+                if compressed_state_out is None:
+                    continue
+                # construct transition
+                # no matter what state we're in, just keep it. we're just reading.
+                # connect old save to new save
+                # don't write anything, go right
+                yield from (build_transition(
+                    state_in=compressed_state_in,
+                    char_in=char_in,
+                    state_out=compressed_state_out,
+                    char_out=char_in,
+                    direction=Directions.R
+                ) for char_in in chars_in)
 
 
 ################################################################
@@ -517,8 +588,7 @@ def build_transitions_stage_one(compressed_alphabet: list[Char], compressed_stat
 ################################################################
 
 
-def build_transitions_stage_one_to_two(original_function: TransitionFunction, compressed_states_map_reading: dict[ReadingStageInfo, int], compressed_states_map_writing: dict[WritingStageInfo, int]) -> list[tuple[TransitionIn, TransitionOut]]:
-    compressed_transitions: list[tuple[TransitionIn, TransitionOut]] = []
+def build_transitions_stage_one_to_two(original_function: TransitionFunction, compressed_states_map_reading: dict[ReadingStageInfo, int], compressed_states_map_writing: dict[WritingStageInfo, int]) -> Iterator[tuple[TransitionIn, TransitionOut]]:
     incomplete_saves: Iterable[ReadingStageInfo] = compressed_states_map_reading.keys()
     # we saved some state and chars
     for original_state_in, complete_save in incomplete_saves:
@@ -530,21 +600,19 @@ def build_transitions_stage_one_to_two(original_function: TransitionFunction, co
         # this is where the actual work is done: construct what the original function would do
         original_trans_out = original_function.get(original_state_in, original_chars_in)
         # construct compressed version of the original transition output
-        original_state_out, original_chars_and_dirs_out = original_trans_out
-        compressed_trans_out = (original_state_out, tuple(original_chars_and_dirs_out))
+        compressed_trans_out = canonicalize(original_trans_out)
         compressed_state_in = compressed_states_map_reading[original_state_in, complete_save]
         compressed_state_out = compressed_states_map_writing[compressed_trans_out]
         # construct the transition
         # we found the end of the tape
         # don't write anything, just change states and go left again
-        compressed_transitions.append(build_transition(
+        yield build_transition(
             state_in=compressed_state_in,
             char_in='_',
             state_out=compressed_state_out,
             char_out='_',
             direction=Directions.L
-        ))
-    return compressed_transitions
+        )
 
 
 ################################################################
@@ -552,77 +620,76 @@ def build_transitions_stage_one_to_two(original_function: TransitionFunction, co
 ################################################################
 
 
-def write_compressed(char_in: Char, chars_and_dirs_out: list[tuple[Char, Directions]], n_tapes: int) -> Char:
-    """Reads a compressed char and writes the respective single chars where the headers are."""
+def write_compressed(heads: bytes, chars: str, chars_out: tuple[Char]) -> str:
+    """Reads a compressed char (split into heads and chars) and writes the respective single chars where the headers are. Returns the new chars."""
 
-    # make mutable representation of the compressed input char
-    char_out = list(char_in)
-    # iterate over all the tapes
-    for i in range(n_tapes):
-        # if we found a head
-        if char_in[2 * i] == '*':
-            # write the respective char
-            # reminder: char_out is built like this: *a-b-c*d-e*f...
-            # chars_and_dirs_out is built like this: [(p, N), (q, R), (r, L), ...]
-            char_out[2 * i + 1] = chars_and_dirs_out[i][0]
-    # make char immutable again
-    return "".join(char_out)
+    # heads are built like this: b'*-*...', chars like this: abc...
+    # chars_out is built like this: (p, q, r, ...)
+    return "".join(char_out if head == STAR else char for head, char, char_out in zip(heads, chars, chars_out))
 
 
-def illegal_start_write(char_in: Char, char_out: Char) -> bool:
+def illegal_start_write(chars_in: str, chars_out: str) -> bool:
     """Returns if a start symbol was written somewhere it's not supposed to be written."""
 
     # we don't want to write the start symbol anywhere in the middle of the tape
-    return 'S' not in char_in and 'S' in char_out
+    return 'S' not in chars_in and 'S' in chars_out
 
 
-def illegal_start_overwrite(char_in: Char, char_out: Char, n_tapes: int) -> bool:
+def illegal_start_overwrite(chars_in: str, chars_out: str) -> bool:
     """Returns if a non-start symbol was written on start."""
 
     # if we're not overwriting the start symbol, we're fine
-    if 'S' not in char_in:
+    if 'S' not in chars_in:
         return False
     # we're writing on the start symbol, let's hope that we're only writing start symbols
-    for i in range(n_tapes):
-        if char_out[2 * i + 1] != 'S':
-            return True
-    return False
+    return any(char_out != 'S' for char_out in chars_out)
 
 
-def build_transitions_stage_two(compressed_non_start_alphabet: list[Char], compressed_states_map_writing: dict[WritingStageInfo, int], n_tapes: int) -> list[tuple[TransitionIn, TransitionOut]]:
-    compressed_transitions: list[tuple[TransitionIn, TransitionOut]] = []
-    trans_outs: Iterable[TransitionOut] = compressed_states_map_writing.keys()
+def build_transitions_stage_two(compressed_non_start_alphabet: tuple[Char], compressed_states_map_writing: dict[WritingStageInfo, int], n_tapes: int) -> Iterator[tuple[TransitionIn, TransitionOut]]:
+    compressed_states: Iterable[int] = compressed_states_map_writing.values()
     # we observe some chars, not the start chars tho. we don't write start chars.
-    for char_in in compressed_non_start_alphabet:
+    # chars without any heads are never written on, so they don't need to go through the writing logic
+    chars_without_heads = [char_in for char_in in compressed_non_start_alphabet if STAR not in split_compressed(char_in)[0]]
+    chars_with_heads = [char_in for char_in in compressed_non_start_alphabet if STAR in split_compressed(char_in)[0]]
+    # don't change the state, don't write anything, go left
+    yield from (build_transition(
+        state_in=compressed_state,
+        char_in=char_in,
+        state_out=compressed_state,
+        char_out=char_in,
+        direction=Directions.L
+    ) for char_in in chars_without_heads for compressed_state in compressed_states)
+    for char_in in chars_with_heads:
+        heads, chars_in = split_compressed(char_in)
         # we want to write some chars
-        for original_state, chars_and_dirs_out in trans_outs:
+        for (original_state, chars_and_dirs_out), compressed_state in compressed_states_map_writing.items():
             # if we find headers, write on them
-            char_out = write_compressed(char_in, chars_and_dirs_out, n_tapes)
+            wrote_chars, _ = split_chars_and_dirs(chars_and_dirs_out)
+            chars_out = write_compressed(heads, chars_in, wrote_chars)
             # if we'd be writing start illegaly here, just don't include the transition
             # this can occur here because we don't know when the saved chars are written down
-            if illegal_start_write(char_in, char_out):
+            if illegal_start_write(chars_in, chars_out):
                 continue
             # what if the original function wants to write on start? nah man.
-            if illegal_start_overwrite(char_in, char_out, n_tapes):
+            if illegal_start_overwrite(chars_in, chars_out):
                 continue
+            char_out = join_compressed(heads, chars_out)
             # DEBUG
             # if char_out == "-0-0*S-0":
             #     print("HEY")
             #     print(char_in)
             #     print(chars_and_dirs_out)
-            compressed_state = compressed_states_map_writing[original_state, chars_and_dirs_out]
             # construct transition
             # don't change the state
             # write the compressed char
             # go left
-            compressed_transitions.append(build_transition(
+            yield build_transition(
                 state_in=compressed_state,
                 char_in=char_in,
                 state_out=compressed_state,
                 char_out=char_out,
                 direction=Directions.L
-            ))
-    return compressed_transitions
+            )
 
 
 ################################################################
@@ -630,30 +697,30 @@ def build_transitions_stage_two(compressed_non_start_alphabet: list[Char], compr
 ################################################################
 
 
-def build_transitions_stage_two_to_three(compressed_start_alphabet: list[Char], compressed_states_map_writing: dict[WritingStageInfo, int], compressed_states_map_moving_right: dict[MovingStageInfo, int], n_tapes: int) -> list[tuple[TransitionIn, TransitionOut]]:
-    compressed_transitions: list[tuple[TransitionIn, TransitionOut]] = []
-    trans_outs: Iterable[TransitionOut] = compressed_states_map_writing.keys()
+def build_transitions_stage_two_to_three(compressed_start_alphabet: tuple[Char], compressed_states_map_writing: dict[WritingStageInfo, int], compressed_states_map_moving_right: dict[MovingStageInfo, int], n_tapes: int) -> Iterator[tuple[TransitionIn, TransitionOut]]:
+    # start stage 3 with no headers found
+    headers_found = NO_HEADS_FOUND
+    # the states don't depend on the start char we observe, so look them up once
+    stage_states: list[tuple[int, int]] = []
+    # we wrote some chars and we're in some state and stuff
+    for (original_state, chars_and_dirs_out), compressed_state_in in compressed_states_map_writing.items():
+        # separate written chars and directions, to forget about the chars we wrote
+        _, dirs_out = split_chars_and_dirs(chars_and_dirs_out)
+        # transition between stages
+        compressed_state_out = compressed_states_map_moving_right[original_state, dirs_out, headers_found]
+        stage_states.append((compressed_state_in, compressed_state_out))
     # we observe only start chars
     for compressed_start_char in compressed_start_alphabet:
-        # we wrote some chars and we're in some state and stuff
-        for original_state, chars_and_dirs_out in trans_outs:
-            # separate written chars and directions, to forget about the chars we wrote
-            wrote_chars, dirs_out = zip(*chars_and_dirs_out)
-            # start stage 3 with no headers found
-            headers_found = tuple([False] * n_tapes)
-            # transition between stages
-            compressed_state_in = compressed_states_map_writing[original_state, chars_and_dirs_out]
-            compressed_state_out = compressed_states_map_moving_right[original_state, tuple(dirs_out), headers_found]
+        for compressed_state_in, compressed_state_out in stage_states:
             # construct transition
             # don't write anything, don't move anywhere, just change states
-            compressed_transitions.append(build_transition(
+            yield build_transition(
                 state_in=compressed_state_in,
                 char_in=compressed_start_char,
                 state_out=compressed_state_out,
                 char_out=compressed_start_char,
                 direction=Directions.N
-            ))
-    return compressed_transitions
+            )
 
 
 ################################################################
@@ -661,96 +728,99 @@ def build_transitions_stage_two_to_three(compressed_start_alphabet: list[Char],
 ################################################################
 
 
-def head_clash_moving(char_in: Char, found_directions: tuple[bool], n_tapes: int) -> bool:
-    """Returns `True` if we just found a char on some tape, but then found another header."""
+@cache
+def direction_mask(directions: tuple[Directions], desired_direction: Directions) -> int:
+    """Returns the tapes on which we're moving into the desired direction as a bitmask (bit i is tape i)."""
 
-    for i in range(n_tapes):
-        # every 2nd char in `char_in` indicates if the head is there
-        head_found = char_in[2 * i] == '*'
-        if head_found and found_directions[i]:
-            return True
-    return False
+    return sum(1 << i for i, direction in enumerate(directions) if direction is desired_direction)
 
 
-def pick_up_heads(compressed_char: Char, directions: tuple[Directions], n_tapes: int, desired_direction: Directions) -> tuple[Char, tuple[bool]]:
-    """Picks up the heads on each tape if we're moving into the desired direction on that tape.
+def pick_up_heads(heads: bytes, picked_up_heads: int) -> bytes:
+    """Picks up the heads on the tapes in `picked_up_heads` (the heads we found on tapes where we're moving into the desired direction).
 
-    Returns new compressed char without the picked up heads, also returns positions where the heads where picked up."""
+    Returns new heads without the picked up heads."""
 
-    heads_found = [compressed_char[2 * i] == '*' for i in range(n_tapes)]
-    # pickup heads that we found, but only if we're going into the desired direction
-    picked_up_heads = [heads_found[i] and directions[i] == desired_direction for i in range(n_tapes)]
-    # create a mutable representation
-    new_char = list(compressed_char)
-    for i in range(n_tapes):
-        # if the head on the i-th tape was picked up, remove it
-        if picked_up_heads[i]:
-            new_char[2 * i] = '-'
-    # make immutable again
-    return "".join(new_char), tuple(picked_up_heads)
+    new_heads = bytearray(heads)
+    # only visit the bits that are set
+    while picked_up_heads:
+        lowest_bit = picked_up_heads & -picked_up_heads
+        new_heads[lowest_bit.bit_length() - 1] = DASH
+        picked_up_heads ^= lowest_bit
+    return bytes(new_heads)
 
 
-def drop_heads(compressed_char: Char, dropped_heads: tuple[bool], n_tapes: int) -> Char:
+def drop_heads(heads: bytes, dropped_heads: int) -> bytes:
     """Writes the heads we found in the previous cell to the current cell (because we want to move them)."""
 
-    # create mutable representation
-    new_char = list(compressed_char)
-    for i in range(n_tapes):
-        if dropped_heads[i]:
-            new_char[2 * i] = '*'
-    # make char immutable again
-    return "".join(new_char)
-
-
-def build_transitions_stage_three(compressed_alphabet: list[Char], compressed_states_map_moving_right: dict[MovingStageInfo, int], n_tapes: int) -> list[tuple[TransitionIn, TransitionOut]]:
-    compressed_transitions: list[tuple[TransitionIn, TransitionOut]] = []
+    new_heads = bytearray(heads)
+    for i in range(len(new_heads)):
+        if dropped_heads >> i & 1:
+            new_heads[i] = STAR
+    return bytes(new_heads)
+
+
+def build_transitions_moving(compressed_alphabet: tuple[Char], compressed_states_map_moving: dict[MovingStageInfo, int], going: Directions) -> Iterator[tuple[TransitionIn, TransitionOut]]:
+    """Builds the transitions that move the heads into the direction we're `going` (stage 3 and stage 4)."""
+
+    # whether a char clashes only depends on the heads we dropped, so group the infos by them
+    infos_by_dropped_heads: dict[int, list[MoveInfo]] = {}
+    # the original state and the directions stay the same while moving, so look up the states only by the found heads
+    states_by_move: dict[MoveInfo, dict[int, int]] = {}
+    for (original_state, directions, dropped_heads), compressed_state in compressed_states_map_moving.items():
+        infos_by_dropped_heads.setdefault(dropped_heads, []).append((original_state, directions))
+        states_by_move.setdefault((original_state, directions), {})[dropped_heads] = compressed_state
+    split_chars = split_alphabet(compressed_alphabet)
+    for dropped_heads, move_infos in infos_by_dropped_heads.items():
+        # we can't find a head immediately after we just found it (on the same tape)
+        valid_chars = [(compressed_char, heads, chars, char_head_bits) for compressed_char, heads, chars, char_head_bits in split_chars if not char_head_bits & dropped_heads]
+        for move_info in move_infos:
+            _, directions = move_info
+            # the tapes where we pick up the heads we find
+            moving_heads = direction_mask(directions, going)
+            states_by_heads = states_by_move[move_info]
+            compressed_state_in = states_by_heads[dropped_heads]
+            for compressed_char_in, heads_in, chars_in, char_head_bits in valid_chars:
+                # save what heads we're finding on the tapes
+                picked_up_heads = char_head_bits & moving_heads
+                # build transition
+                # remember the heads we just picked up in the state
+                # write down the heads we just found in the previous cell
+                # change heads and keep going
+                yield build_transition(
+                    state_in=compressed_state_in,
+                    char_in=compressed_char_in,
+                    state_out=states_by_heads[picked_up_heads],
+                    char_out=join_compressed(drop_heads(pick_up_heads(heads_in, picked_up_heads), dropped_heads), chars_in),
+                    direction=going
+                )
+
+
+def build_transitions_stage_three(compressed_alphabet: tuple[Char], compressed_states_map_moving_right: dict[MovingStageInfo, int], n_tapes: int) -> Iterator[tuple[TransitionIn, TransitionOut]]:
     moving_stage_infos: Iterable[MovingStageInfo] = compressed_states_map_moving_right.keys()
     # scenario: we found another compressed char and want to move the picked up heads
-    for compressed_char_in in compressed_alphabet:
-        for original_state, directions, dropped_heads in moving_stage_infos:
-            # we can't find a head immediately after we just found it
-            if head_clash_moving(compressed_char_in, dropped_heads, n_tapes):
-                continue
-            # save what heads we're finding on the tapes
-            picked_up_char, picked_up_heads = pick_up_heads(compressed_char_in, directions, n_tapes, desired_direction=Directions.R)
-            # write down the heads we just found in the previous cell
-            compressed_char_out = drop_heads(picked_up_char, dropped_heads, n_tapes)
-            # figure out states
-            compressed_state_in = compressed_states_map_moving_right[original_state, directions, dropped_heads]
-            compressed_state_out = compressed_states_map_moving_right[original_state, directions, picked_up_heads]
-            # build transition
-            # remember the heads we just picked up in the state
-            # change heads and go right
-            compressed_transitions.append(build_transition(
-                state_in=compressed_state_in,
-                char_in=compressed_char_in,
-                state_out=compressed_state_out,
-                char_out=compressed_char_out,
-                direction=Directions.R
-            ))
+    yield from build_transitions_moving(compressed_alphabet, compressed_states_map_moving_right, going=Directions.R)
     # scenario: we found a blank ('_') but still haven't moved all the heads -> expand tapes
-    no_heads = tuple([False] * n_tapes)
-    new_blanks = "-_" * n_tapes
+    no_heads = NO_HEADS_FOUND
+    new_blanks_heads, new_blanks_chars = b"-" * n_tapes, "_" * n_tapes
     for original_state, directions, dropped_heads in moving_stage_infos:
         # we just consider cases where we actually have to move something (otherwise we don't need new blanks)
         if dropped_heads == no_heads:
             continue
         # make a new blank symbol on every tape but with some heads
-        compressed_char_out = drop_heads(new_blanks, dropped_heads, n_tapes)
+        compressed_char_out = join_compressed(drop_heads(new_blanks_heads, dropped_heads), new_blanks_chars)
         # figure out states
         compressed_state_in = compressed_states_map_moving_right[original_state, directions, dropped_heads]
         # we can't pick up any heads on a new blank
         compressed_state_out = compressed_states_map_moving_right[original_state, directions, no_heads]
         # build transition
         # don't change the state
-        compressed_transitions.append(build_transition(
+        yield build_transition(
             state_in=compressed_state_in,
             char_in='_',
             state_out=compressed_state_out,
             char_out=compressed_char_out,
             direction=Directions.R
-        ))
-    return compressed_transitions
+        )
 
 
 ################################################################
@@ -758,27 +828,25 @@ def build_transitions_stage_three(compressed_alphabet: list[Char], compressed_st
 ################################################################
 
 
-def build_transitions_stage_three_to_four(compressed_moves_going_right: set[MoveInfo], compressed_states_map_moving_right: dict[MovingStageInfo, int], compressed_states_map_moving_left: dict[MovingStageInfo, int], n_tapes: int) -> list[tuple[TransitionIn, TransitionOut]]:
-    compressed_transitions: list[tuple[TransitionIn, TransitionOut]] = []
-    no_heads = tuple([False] * n_tapes)
+def build_transitions_stage_three_to_four(compressed_moves_going_right: frozenset[MoveInfo], compressed_states_map_moving_right: dict[MovingStageInfo, int], compressed_states_map_moving_left: dict[MovingStageInfo, int], n_tapes: int) -> Iterator[tuple[TransitionIn, TransitionOut]]:
+    no_heads = NO_HEADS_FOUND
     # we see a blank ('_') and we're done moving all the heads to the right. Let's forget about them and start moving heads to the left.
     for original_state, old_directions in compressed_moves_going_right:
         # replace all the Directions.R with Directions.N
-        new_directions = tuple([Directions.N if direction == Directions.R else direction for direction in old_directions])
+        new_directions = without_right(old_directions)
         # we already moved all the heads to the right
         compressed_state_in = compressed_states_map_moving_right[original_state, old_directions, no_heads]
         # and we didn't find any head to move to the left yet
         compressed_state_out = compressed_states_map_moving_left[original_state, new_directions, no_heads]
         # build transition
         # don't write anything, just change states and go left
-        compressed_transitions.append(build_transition(
+        yield build_transition(
             state_in=compressed_state_in,
             char_in='_',
             state_out=compressed_state_out,
             char_out='_',
             direction=Directions.L
-        ))
-    return compressed_transitions
+        )
 
 
 ################################################################
@@ -786,30 +854,8 @@ def build_transitions_stage_three_to_four(compressed_moves_going_right: set[Move
 ################################################################
 
 
-def build_transitions_stage_four(compressed_alphabet: list[Char], compressed_states_map_moving_left: dict[MovingStageInfo, int], n_tapes: int) -> list[tuple[TransitionIn, TransitionOut]]:
-    compressed_transitions: list[tuple[TransitionIn, TransitionOut]] = []
-    moving_stage_infos: Iterable[MovingStageInfo] = compressed_states_map_moving_left.keys()
-    for compressed_char_in in compressed_alphabet:
-        for original_state, directions, dropped_heads in moving_stage_infos:
-            # we can't find a head immediately after we just found it
-            if head_clash_moving(compressed_char_in, dropped_heads, n_tapes):
-                continue
-            # save what heads we're finding on the tapes
-            picked_up_char, picked_up_heads = pick_up_heads(compressed_char_in, directions, n_tapes, desired_direction=Directions.L)
-            # write down the heads we just found in the previous cell
-            compressed_char_out = drop_heads(picked_up_char, dropped_heads, n_tapes)
-            # figure out states
-            compressed_state_in = compressed_states_map_moving_left[original_state, directions, dropped_heads]
-            compressed_state_out = compressed_states_map_moving_left[original_state, directions, picked_up_heads]
-            # build transition
-            compressed_transitions.append(build_transition(
-                state_in=compressed_state_in,
-                char_in=compressed_char_in,
-                state_out=compressed_state_out,
-                char_out=compressed_char_out,
-                direction=Directions.L
-            ))
-    return compressed_transitions
+def build_transitions_stage_four(compressed_alphabet: tuple[Char], compressed_states_map_moving_left: dict[MovingStageInfo, int], n_tapes: int) -> Iterator[tuple[TransitionIn, TransitionOut]]:
+    return build_transitions_moving(compressed_alphabet, compressed_states_map_moving_left, going=Directions.L)
 
 
 ################################################################
@@ -817,10 +863,10 @@ def build_transitions_stage_four(compressed_alphabet: list[Char], compressed_sta
 ################################################################
 
 
-def build_transitions_stage_four_to_one(compressed_moves_going_left: set[MoveInfo], compressed_states_map_moving_left: dict[MovingStageInfo, int], compressed_states_map_reading: dict[ReadingStageInfo, int], n_tapes) -> list[tuple[TransitionIn, TransitionOut]]:
+def build_transitions_stage_four_to_one(compressed_moves_going_left: frozenset[MoveInfo], compressed_states_map_moving_left: dict[MovingStageInfo, int], compressed_states_map_reading: dict[ReadingStageInfo, int], n_tapes) -> Iterator[tuple[TransitionIn, TransitionOut]]:
     # if we find the actual start ('S'), just go back to ready state and
-    compressed_transitions: list[tuple[TransitionIn, TransitionOut]] = []
-    no_heads = tuple([False] * n_tapes)
+    no_heads = NO_HEADS_FOUND
+    saved_chars = nothing_saved(n_tapes)
     # we pretty much only care about the original state
     for original_state, directions in compressed_moves_going_left:
         # just go on with the whole simulation if we're not in an endstate
@@ -829,17 +875,15 @@ def build_transitions_stage_four_to_one(compressed_moves_going_left: set[MoveInf
         compressed_state_in = compressed_states_map_moving_left[original_state, directions, no_heads]
         # no matter what directions we wrote, what heads we dropped, whatever. just forget about it.
         # remember the state we're in however
-        saved_chars = ' ' * n_tapes
         compressed_state_out = compressed_states_map_reading[original_state, saved_chars]
         # just go into ready state and move right
-        compressed_transitions.append(build_transition(
+        yield build_transition(
             state_in=compressed_state_in,
             char_in='S',
             state_out=compressed_state_out,
             char_out='S',
             direction=Directions.R
-        ))
-    return compressed_transitions
+        )
 
 
 ################################################################
@@ -847,10 +891,9 @@ def build_transitions_stage_four_to_one(compressed_moves_going_left: set[MoveInf
 ################################################################
 
 
-def build_transitions_stage_four_to_five(compressed_moves_going_left: set[MoveInfo], compressed_states_map_moving_left: dict[MovingStageInfo, int], n_tapes) -> list[tuple[TransitionIn, TransitionOut]]:
+def build_transitions_stage_four_to_five(compressed_moves_going_left: frozenset[MoveInfo], compressed_states_map_moving_left: dict[MovingStageInfo, int], n_tapes) -> Iterator[tuple[TransitionIn, TransitionOut]]:
     # if we find the actual start ('S'), just go back to ready state and
-    compressed_transitions: list[tuple[TransitionIn, TransitionOut]] = []
-    no_heads = tuple([False] * n_tapes)
+    no_heads = NO_HEADS_FOUND
     # we pretty much only care about the original state
     for original_state, directions in compressed_moves_going_left:
         # just go on with the whole simulation if we're not in an endstate
@@ -860,23 +903,22 @@ def build_transitions_stage_four_to_five(compressed_moves_going_left: set[MoveIn
         # no matter what directions we wrote, what heads we dropped, whatever. just forget about it.
         # either accept or reject
         if original_state in [EndStates.ACCEPT, EndStates.REJECT]:
-            compressed_transitions.append(build_transition(
+            yield build_transition(
                 state_in=compressed_state_in,
                 char_in='S',
                 state_out=original_state,
                 char_out='S',
                 direction=Directions.N
-            ))
+            )
         # halt state -> cleanup
         else:
-            compressed_transitions.append(build_transition(
+            yield build_transition(
                 state_in=compressed_state_in,
                 char_in='S',
                 state_out=STATE_CLEANUP,
                 char_out='S',
                 direction=Directions.R
-            ))
-    return compressed_transitions
+            )
 
 
 ################################################################
@@ -884,66 +926,73 @@ def build_transitions_stage_four_to_five(compressed_moves_going_left: set[MoveIn
 ################################################################
 
 
-def build_transitions_stage_five(original_alphabet: list[Char], compressed_start_alphabet: list[Char], compressed_non_start_alphabet: list[Char], compressed_states_map_cleanup: dict[Char, int]) -> list[tuple[TransitionIn, TransitionOut]]:
-    compressed_transitions: list[tuple[TransitionIn, TransitionOut]] = []
-    compressed_alphabet = compressed_start_alphabet + compressed_non_start_alphabet
-
+def build_transitions_stage_five(original_alphabet: list[Char], compressed_alphabet: tuple[Char], compressed_start_alphabet: tuple[Char], compressed_non_start_alphabet: tuple[Char], compressed_states_map_cleanup: dict[Char, int]) -> Iterator[tuple[TransitionIn, TransitionOut]]:
     # first go right no matter what compressed char we see
-    for observed_compressed_char in compressed_alphabet:
-        compressed_transitions.append(build_transition(
-            state_in=STATE_CLEANUP,
-            char_in=observed_compressed_char,
-            state_out=STATE_CLEANUP,
-            char_out=observed_compressed_char,
-            direction=Directions.R
-        ))
+    going_right = (build_transition(
+        state_in=STATE_CLEANUP,
+        char_in=observed_compressed_char,
+        state_out=STATE_CLEANUP,
+        char_out=observed_compressed_char,
+        direction=Directions.R
+    ) for observed_compressed_char in compressed_alphabet)
 
     # then if we find blank ('_'), go left and start copying the last tape (and shifting)
     remembered_blank = compressed_states_map_cleanup['_']
-    compressed_transitions.append(build_transition(
+    found_blank = [build_transition(
         state_in=STATE_CLEANUP,
         char_in='_',
         state_out=remembered_blank,
         char_out='_',
         direction=Directions.L
-    ))
+    )]
+
+    # look up the states once, not for every pair of remembered and observed char
+    remembering_states = [(remembered_char, compressed_states_map_cleanup[remembered_char]) for remembered_char in original_alphabet + ['_']]
+    # doesn't matter what compressed char we observe, we only care for the char on the last tape.
+    observed_last_char_states = [(observed_compressed_char, compressed_states_map_cleanup[observed_compressed_char[-1]]) for observed_compressed_char in compressed_non_start_alphabet]
 
     # remember the current char in a state. also write down the previous remembered char
-    for remembered_char in original_alphabet + ['_']:
-        for observed_compressed_char in compressed_non_start_alphabet:
-            # doesn't matter what compressed char we observe, we only care for the char on the last tape.
-            char_on_last_tape = observed_compressed_char[-1]
-            # we remembered the char
-            compressed_state_in = compressed_states_map_cleanup[remembered_char]
-            # now we want to remember the char on the last tape
-            compressed_state_out = compressed_states_map_cleanup[char_on_last_tape]
-            # build transition
-            compressed_transitions.append(build_transition(
-                state_in=compressed_state_in,
-                char_in=observed_compressed_char,
-                state_out=compressed_state_out,
-                char_out=remembered_char,
-                direction=Directions.L
-            ))
+    copying = (build_transition(
+        # we remembered the char
+        state_in=remembered_state,
+        char_in=observed_compressed_char,
+        # now we want to remember the char on the last tape
+        state_out=observed_state,
+        char_out=remembered_char,
+        direction=Directions.L
+    ) for remembered_char, remembered_state in remembering_states for observed_compressed_char, observed_state in observed_last_char_states)
 
     # if we find the artificial start symbol, write down the last remembered char and halt.
-    for remembered_char in original_alphabet + ['_']:
-        for compressed_start_char in compressed_start_alphabet:
-            compressed_state_in = compressed_states_map_cleanup[remembered_char]
-            compressed_transitions.append(build_transition(
-                state_in=compressed_state_in,
-                char_in=compressed_start_char,
-                state_out=EndStates.HALT,
-                char_out=remembered_char,
-                direction=Directions.N
-            ))
-    return compressed_transitions
+    halting = (build_transition(
+        state_in=remembered_state,
+        char_in=compressed_start_char,
+        state_out=EndStates.HALT,
+        char_out=remembered_char,
+        direction=Directions.N
+    ) for remembered_char, remembered_state in remembering_states for compressed_start_char in compressed_start_alphabet)
+
+    return itertools.chain(going_right, found_blank, copying, halting)
 
 ################################################################
 # PRETTY MUCH MAIN
 ################################################################
 
 
+def add_transitions(compressed_function: TransitionFunction, transitions: Iterable[tuple[TransitionIn, TransitionOut]]) -> set[int]:
+    """Adds the transitions to the function one by one and returns the (non-end) states they use."""
+
+    used_states: set[int] = set()
+    for trans_in, trans_out in transitions:
+        compressed_function._add(trans_in, trans_out)
+        state_in, _ = trans_in
+        state_out, _ = trans_out
+        if not is_endstate(state_in):
+            used_states.add(state_in)
+        if not is_endstate(state_out):
+            used_states.add(state_out)
+    return used_states
+
+
 def state_map_to_array(state_map: dict[int, Any], used_states: set[int]) -> list[tuple[int, str, str]]:
     return [(state, "->", mapped_to) for mapped_to, state in state_map.items() if state in used_states]
 
@@ -964,13 +1013,13 @@ def compress(original_function: TransitionFunction, save_states_map=False, state
     n_tapes = original_function.n_tapes
     original_input_alphabet = original_function.alphabet
     # extract info from the original function
-    original_trans_ins = extract_trans_ins(original_function)
+    original_trans_ins = tuple(extract_trans_ins(original_function))
     original_trans_outs = extract_trans_outs(original_function)
     # all of the possible directions we can go (where the headers are moved)
-    original_moves = extract_moves(original_function)
+    original_moves = frozenset(extract_moves(original_function))
 
     # start compressing
-    compressed_start_alphabet, compressed_non_start_alphabet = compress_alphabet(original_input_alphabet, n_tapes)
+    compressed_start_alphabet, compressed_non_start_alphabet = compress_alphabet(tuple(original_input_alphabet), n_tapes)
     # the whole alphabet consists of the start chars and the non-start chars
     compressed_alphabet = compressed_start_alphabet + compressed_non_start_alphabet
 
@@ -993,22 +1042,24 @@ def compress(original_function: TransitionFunction, save_states_map=False, state
     compressed_states_map_cleanup, next_state = compress_states_cleanup(original_input_alphabet, start_at=next_state)
 
     # start building the transitions
-    compressed_transitions: list[tuple[TransitionIn, TransitionOut]] = []
-    compressed_transitions += build_transitions_stage_zero(original_input_alphabet, compressed_states_map_copying, n_tapes)
-    compressed_transitions += build_transitions_stage_zero_to_one(compressed_alphabet, compressed_states_map_reading, n_tapes)
-    compressed_transitions += build_transitions_stage_one(compressed_alphabet, compressed_states_map_reading, n_tapes)
-    compressed_transitions += build_transitions_stage_one_to_two(original_function, compressed_states_map_reading, compressed_states_map_writing)
-    compressed_transitions += build_transitions_stage_two(compressed_non_start_alphabet, compressed_states_map_writing, n_tapes)
-    compressed_transitions += build_transitions_stage_two_to_three(compressed_start_alphabet, compressed_states_map_writing, compressed_states_map_moving_right, n_tapes)
-    compressed_transitions += build_transitions_stage_three(compressed_alphabet, compressed_states_map_moving_right, n_tapes)
-    compressed_transitions += build_transitions_stage_three_to_four(compressed_moves_going_right, compressed_states_map_moving_right, compressed_states_map_moving_left, n_tapes)
-    compressed_transitions += build_transitions_stage_four(compressed_alphabet, compressed_states_map_moving_left, n_tapes)
-    compressed_transitions += build_transitions_stage_four_to_one(compressed_moves_going_left, compressed_states_map_moving_left, compressed_states_map_reading, n_tapes)
-    compressed_transitions += build_transitions_stage_four_to_five(compressed_moves_going_left, compressed_states_map_moving_left, n_tapes)
-    compressed_transitions += build_transitions_stage_five(original_input_alphabet, compressed_start_alphabet, compressed_non_start_alphabet, compressed_states_map_cleanup)
-
+    # the transitions are added as they are built, the number of states is known afterwards
+    compressed_function = TransitionFunction(0, 1, original_input_alphabet + list(compressed_alphabet))
+    used_states = add_transitions(compressed_function, itertools.chain(
+        build_transitions_stage_zero(original_input_alphabet, compressed_states_map_copying, n_tapes),
+        build_transitions_stage_zero_to_one(compressed_alphabet, compressed_states_map_reading, n_tapes),
+        build_transitions_stage_one(compressed_alphabet, compressed_states_map_reading, n_tapes),
+        build_transitions_stage_one_to_two(original_function, compressed_states_map_reading, compressed_states_map_writing),
+        build_transitions_stage_two(compressed_non_start_alphabet, compressed_states_map_writing, n_tapes),
+        build_transitions_stage_two_to_three(compressed_start_alphabet, compressed_states_map_writing, compressed_states_map_moving_right, n_tapes),
+        build_transitions_stage_three(compressed_alphabet, compressed_states_map_moving_right, n_tapes),
+        build_transitions_stage_three_to_four(compressed_moves_going_right, compressed_states_map_moving_right, compressed_states_map_moving_left, n_tapes),
+        build_transitions_stage_four(compressed_alphabet, compressed_states_map_moving_left, n_tapes),
+        build_transitions_stage_four_to_one(compressed_moves_going_left, compressed_states_map_moving_left, compressed_states_map_reading, n_tapes),
+        build_transitions_stage_four_to_five(compressed_moves_going_left, compressed_states_map_moving_left, n_tapes),
+        build_transitions_stage_five(original_input_alphabet, compressed_alphabet, compressed_start_alphabet, compressed_non_start_alphabet, compressed_states_map_cleanup),
+    ))
     # we might not use all the states we created
-    used_states = extract_non_end_states(compressed_transitions)
+    compressed_function.n_states = len(used_states)
 
     if save_states_map:
         print("Saving state map.")
@@ -1036,11 +1087,11 @@ def compress(original_function: TransitionFunction, save_states_map=False, state
         with open(states_map_file, 'w') as f:
             f.write(save_states_str)
 
-    # build transition function
-    n_states = len(used_states)
-    compressed_function = TransitionFunction(n_states, 1, original_input_alphabet + compressed_alphabet)
-    for trans_in, trans_out in compressed_transitions:
-        compressed_function._add(trans_in, trans_out)
+    # the transitions keep the shared outputs alive, the caches don't need to
+    # (the caches of the chars only help within one compression)
+    transition_out.cache_clear()
+    split_compressed.cache_clear()
+    join_compressed.cache_clear()
 
     return compressed_function
 
@@ -1059,8 +1110,10 @@ def main():
 
     # load tm
     original = TransitionFunction.from_file(args.tm)
-    out_file = f"machines/{Path(args.tm).stem}_compressed.txt"
-    map_file = f"maps/{Path(args.tm).stem}_compressed_map.txt"
+    # "task1.txt" -> "task1"
+    basename = Path(args.tm).stem
+    out_file = f"machines/{basename}_compressed.txt"
+    map_file = f"maps/{basename}_compressed_map.txt"
     print("Compressing.")
     compressed = compress(original, save_states_map=args.savemap, states_map_file=map_file)
     print("Saving transtition function.")
@@ -1,4 +1,3 @@
-import os
 from typing import TYPE_CHECKING
 
 # this stuff is kinda weird (but it's needed)
@@ -13,26 +12,31 @@ else:
 class ScrollableDisplay:
     def __init__(self, window: Window) -> None:
         self.window = window
-        self.display_str = ""
+        # the text is kept line by line, so showing a part of it doesn't need to split all of it
+        # (the last line is the one that is still being added to)
+        self.lines = [""]
         self.pos = 0
 
     def add(self, string: str):
-        self.display_str += string
+        first_line, *new_lines = string.split("\n")
+        self.lines[-1] += first_line
+        self.lines.extend(new_lines)
 
     def clear(self):
-        self.display_str = ""
+        self.lines = [""]
 
     def scroll(self, n_lines: int):
         self.pos += n_lines
         self.pos = max(self.pos, 0)
-        self.pos = min(self.pos, self.display_str.count(os.linesep))
+        self.pos = min(self.pos, len(self.lines) - 1)
         self.update()
 
     def update(self):
         max_rows, _ = self.window.getmaxyx()
-        lines = self.display_str.splitlines()
-        display_end = min(self.pos + max_rows, len(lines))
-        displayed_lines = lines[self.pos:display_end]
+        # a line break at the very end doesn't start a new line
+        n_lines = len(self.lines) if self.lines[-1] else len(self.lines) - 1
+        display_end = min(self.pos + max_rows, n_lines)
+        displayed_lines = self.lines[self.pos:display_end]
         window_str = "\n".join(displayed_lines)
         self.window.clear()
         self.window.addstr(window_str)
@@ -1,10 +1,11 @@
 import argparse
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 from typing import Self
 
-import matplotlib.pyplot as plt
 import numpy as np
 
+import turing_machines.test as test
 from turing_machines.tm import TuringMachine
 
 MAX_TICKS = 20
@@ -12,7 +13,8 @@ IRRELEVANT_PARAM_MARGIN = 0.005
 
 
 def poly(x, degree):
-    return np.vander(x, degree + 1, True).T
+    # shape: (n samples, n features)
+    return np.vander(x, degree + 1, True)
 
 
 class PolyReg:
@@ -23,14 +25,16 @@ class PolyReg:
         self.c = c
 
     def fit(self, x: np.ndarray, y: np.ndarray) -> Self:
-        dm = poly(x, self.d)
-        xxt = dm @ dm.T
-        self.theta = np.linalg.solve(xxt + self.c * np.eye(xxt.shape[0]), dm @ y)
+        a = poly(x, self.d)
+        if self.c == 0:
+            # plain least squares, no need to square the condition number with the normal equations
+            self.theta = np.linalg.lstsq(a, y, rcond=None)[0]
+        else:
+            self.theta = np.linalg.solve(a.T @ a + self.c * np.eye(self.d + 1), a.T @ y)
         return self
 
     def predict(self, x: np.ndarray):
-        # X shape: (n features, n samples)
-        return self.theta.T @ poly(x, self.d)
+        return poly(x, self.d) @ self.theta
 
     def str_parameters(self, varname="x") -> str:
         """String representation of the parameters as a polynomial of `varname`."""
@@ -55,40 +59,77 @@ class PolyReg:
         return sb
 
 
-def measure(tm: TuringMachine, inputs: list[str], show_progress=False) -> list[int]:
-    if show_progress:
-        from tqdm import tqdm
-        return [tm.runtime(x) for x in tqdm(inputs)]
-    return [tm.runtime(x) for x in inputs]
+# the TM of a measuring worker process (sent once per process, not once per input)
+worker_tm: TuringMachine | None = None
+
+
+def init_worker(tm: TuringMachine):
+    global worker_tm
+    worker_tm = tm
+
+
+def worker_runtimes(inputs: list[str]) -> list[int]:
+    return worker_tm.runtimes(inputs)
+
+
+def measure(tm: TuringMachine, inputs: list[str], show_progress=False, workers=1) -> list[int]:
+    """Measures the runtime of the TM on every input. With `workers` > 1, the inputs are split between that many processes."""
+
+    # the TM is deterministic, so an input that shows up more than once only has to be run once
+    unique_inputs = list(dict.fromkeys(inputs))
+    if len(unique_inputs) < len(inputs):
+        runtime_of = dict(zip(unique_inputs, measure(tm, unique_inputs, show_progress, workers)))
+        return [runtime_of[x] for x in inputs]
+    if workers <= 1:
+        if show_progress:
+            from tqdm import tqdm
+            return tm.runtimes(tqdm(inputs))
+        return tm.runtimes(inputs)
+    # a few batches per worker, so the workers that get the short inputs don't idle at the end
+    batch_size = max(1, len(inputs) // (workers * 4))
+    batches = [inputs[i:i + batch_size] for i in range(0, len(inputs), batch_size)]
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker, initargs=(tm,)) as executor:
+        batch_times = executor.map(worker_runtimes, batches)
+        if show_progress:
+            from tqdm import tqdm
+            batch_times = tqdm(batch_times, total=len(batches))
+        return [time for times in batch_times for time in times]
 
 
 def worst_times(inputs: list[str], times: list[int]) -> tuple[np.ndarray, np.ndarray]:
     """Finds the worst case time for given input of length n."""
 
     assert len(inputs) == len(times), "Inputs and times must be same size."
-    # dict: input length -> time
-    worst_time: dict[int, int] = {}
-    for x, time in zip(inputs, times):
-        # see what length the input has and compare it to the current max time of that size
-        n = len(x)
-        if n not in worst_time:
-            worst_time[n] = time
-            continue
-        worst_time[n] = max(worst_time[n], time)
-    # turn the dict into 2 lists
-    ns, times = zip(*worst_time.items())
-    return np.array(ns), np.array(times)
+    ns = np.fromiter((len(x) for x in inputs), dtype=np.int64, count=len(inputs))
+    times = np.asarray(times)
+    # sort by input length, so every length is one contiguous block
+    order = np.argsort(ns, kind='stable')
+    ns, times = ns[order], times[order]
+    # the worst time of each block is the worst time for that length
+    lengths, starts = np.unique(ns, return_index=True)
+    return lengths, np.maximum.reduceat(times, starts)
+
+
+def pyplot():
+    """Imports matplotlib only for plotting, so the measuring workers don't have to import it."""
+
+    import matplotlib.pyplot as plt
+    return plt
 
 
 def plot_regression_line(x, regression: PolyReg, step=0.1):
+    plt = pyplot()
+
     domain = np.arange(np.min(x), np.max(x), step)
     prediction = regression.predict(domain)
     plt.plot(domain, prediction, color='red')
 
 
-def approximate_time(tm: TuringMachine, inputs: list[str], max_degree=4, regularization_constant=0):
+def approximate_time(tm: TuringMachine, inputs: list[str], max_degree=4, regularization_constant=0, workers=1):
+    plt = pyplot()
+
     # get worst times
-    times = measure(tm, inputs)
+    times = measure(tm, inputs, workers=workers)
     n, t = worst_times(inputs, times)
     # approximate the curve
     reg = PolyReg(max_degree, regularization_constant).fit(n, t)
@@ -121,16 +162,27 @@ def main():
     parser.add_argument("-s", "--save",
                         action='store_true',
                         help="Save plot instead of showing it.")
+    parser.add_argument("-j", "--jobs",
+                        type=int,
+                        default=1,
+                        help="Number of processes used for running the Turing Machine on the inputs (only pays off for a lot of long inputs).")
+    parser.add_argument("--cache",
+                        action='store_true',
+                        help="Cache the parsed Turing Machine in the user's cache directory, so it loads faster next time.")
+    parser.add_argument("--test",
+                        action=test.test_action(test.test_runtime),
+                        help="Tests measuring the runtime with multiple processes (no other arguments needed).")
     args = parser.parse_args()
+    plt = pyplot()
 
     # load turing machine and inputs
-    tm = TuringMachine.from_file(args.tm)
+    tm = TuringMachine.from_file(args.tm, use_cache=args.cache)
     with open(args.inputs, 'r') as f:
         # remove whitespace from inputs
         inputs = [line.strip() for line in f.readlines()]
 
     # run the program
-    approximate_time(tm, inputs, args.degree, args.constant)
+    approximate_time(tm, inputs, args.degree, args.constant, workers=args.jobs)
 
     # either save it or show it
     if args.save:
@@ -1,41 +1,149 @@
 from abc import ABC, abstractmethod
+from array import array
 
 from turing_machines.chars import Char, chars_to_str, multichars_to_str, str_to_chars, str_to_multichars, str_to_multistr
 from turing_machines.transitions import Directions
 
 
+################################################################
+# symbol table
+################################################################
+
+# every table starts with these, so they have the same id everywhere
+START_ID = 0
+BLANK_ID = 1
+# as long as there aren't more symbols than that, a cell is a single byte
+MAX_BYTE_SYMBOLS = 256
+# tape buffers start with at least this many cells, so short runs never have to grow them
+MIN_CAPACITY = 64
+
+
+class SymbolTable:
+    """Tapes don't store the chars themselves, only ids of the chars. Every char that is written on a tape gets an id here.
+    The tapes of a TM (and its compiled transitions) share one table, so the ids only mean something together with it."""
+
+    __slots__ = ('symbols', 'ids')
+
+    def __init__(self):
+        self.symbols: list[Char] = ['S', '_']
+        self.ids: dict[Char, int] = {'S': START_ID, '_': BLANK_ID}
+
+    def id(self, char: Char) -> int:
+        """Returns the id of the char (and registers the char if it doesn't have one yet)."""
+
+        cell_id = self.ids.get(char)
+        if cell_id is None:
+            cell_id = len(self.symbols)
+            self.symbols.append(char)
+            self.ids[char] = cell_id
+        return cell_id
+
+    def typecode(self) -> str:
+        """Returns the smallest array typecode that fits every symbol id so far."""
+
+        return 'B' if len(self.symbols) <= MAX_BYTE_SYMBOLS else 'I'
+
+    def encode(self, chars: list[Char]) -> array:
+        """Converts chars to a buffer of their ids."""
+
+        try:
+            # usually every char has an id already
+            return array(self.typecode(), map(self.ids.__getitem__, chars))
+        except KeyError:
+            ids = [self.id(char) for char in chars]
+            return array(self.typecode(), ids)
+
+
+def grow(cells: array):
+    """Doubles the capacity of a tape buffer (the new cells are blank)."""
+
+    cells.extend(array(cells.typecode, (BLANK_ID,)) * len(cells))
+
+
+################################################################
+# tapes
+################################################################
+
 class Tape(ABC):
-    def __init__(self, machine_input: str | list[Char] = None):
+    # tapes are touched on every step, so don't give them a __dict__
+    __slots__ = ('symbols', 'cells', 'length', 'head')
+
+    def __init__(self, machine_input: str | list[Char] = None, symbols: SymbolTable = None):
+        # tapes of the same TM share their symbols
+        self.symbols = symbols if symbols is not None else SymbolTable()
+        self.cells = array(self.symbols.typecode(), (BLANK_ID,)) * MIN_CAPACITY
+        # the buffer can be bigger than the part of the tape we've seen so far
+        self.length = 0
+        self.reset(machine_input)
+
+    def reset(self, machine_input: str | list[Char] = None):
+        """Puts the tape back in its starting state with the input on it. The buffer is reused, so running again doesn't need a new tape."""
+
         if machine_input is None:
             # write standard stuff on tape
-            self.chars: list[Char] = ['S', '_']
+            input_ids = array(self.symbols.typecode(), (START_ID, BLANK_ID))
         else:
-            self.write_input(machine_input)
+            input_ids = self.encode_input(machine_input)
+        if input_ids.typecode == 'I':
+            self.widen()
+        elif self.cells.typecode == 'I':
+            input_ids = array('I', input_ids)
+        n_cells = len(input_ids)
+        # clear what the last run left behind (the rest of the buffer is still blank)
+        if self.length > n_cells:
+            self.cells[n_cells:self.length] = array(self.cells.typecode, (BLANK_ID,)) * (self.length - n_cells)
+        # this makes the buffer bigger if the input doesn't fit
+        self.cells[:n_cells] = input_ids
+        self.length = n_cells
         self.head = 1
 
+    @property
+    def chars(self) -> list[Char]:
+        symbols = self.symbols.symbols
+        return [symbols[cell_id] for cell_id in self.cells[:self.length]]
+
     def read(self) -> Char:
-        return self.chars[self.head]
+        return self.symbols.symbols[self.cells[self.head]]
 
     def write(self, char: Char):
+        cell_id = self.symbols.ids.get(char)
+        if cell_id is None:
+            cell_id = self.symbols.id(char)
         # that should not happen, but it will if your turing machine is weird
-        if self.read() == 'S' and char != 'S':
+        if self.cells[self.head] == START_ID and cell_id != START_ID:
             raise RuntimeError("Start symbol can't be overwritten.")
-        self.chars[self.head] = char
+        try:
+            self.cells[self.head] = cell_id
+        except OverflowError:
+            # the id doesn't fit in a byte
+            self.widen()
+            self.cells[self.head] = cell_id
+
+    def widen(self):
+        """Makes room for symbol ids that don't fit in a byte."""
+
+        if self.cells.typecode != 'I':
+            self.cells = array('I', self.cells)
 
     def move(self, direction: Directions):
-        if direction == Directions.L:
-            self.head -= 1
-        elif direction == Directions.R:
-            self.head += 1
+        head = self.head
+        if direction is Directions.L:
+            head -= 1
+        elif direction is Directions.R:
+            head += 1
+        self.head = head
         # expand tape if necessary (we don't actually have infinite memory)
-        if self.head >= len(self.chars):
-            self.chars.append('_')
+        if head >= self.length:
+            self.length = head + 1
+            if head >= len(self.cells):
+                grow(self.cells)
         # that should not happen, but it will if your turing machine is weird
-        if self.head < 0:
+        if head < 0:
             raise IndexError("Head can't go to the left of the start of the tape.")
 
     @abstractmethod
-    def write_input(self, machine_input: str | list[Char]) -> None:
+    def encode_input(self, machine_input: str | list[Char]) -> array:
+        """Returns the ids of the cells the tape starts with when the input is on it."""
         pass
 
     @abstractmethod
@@ -50,12 +158,14 @@ class Tape(ABC):
 class SingleCharTape(Tape):
     """Represents 1 tape of a Turing Machine."""
 
-    def write_input(self, machine_input: str | list[Char]):
+    __slots__ = ()
+
+    def encode_input(self, machine_input: str | list[Char]) -> array:
         # convert char list to str
-        if type(machine_input) == list[Char]:
+        if isinstance(machine_input, list):
             machine_input = chars_to_str(machine_input)
-        # put input on tape in between and initialize head and state
-        self.chars = str_to_chars(f"S{machine_input}_")
+        # put input on tape in between start and blank
+        return self.symbols.encode(str_to_chars(f"S{machine_input}_"))
 
     def output(self) -> str:
         result = chars_to_str(self.chars)
@@ -69,17 +179,18 @@ class SingleCharTape(Tape):
 
 
 class MultiCharTape(Tape):
-    def write_input(self, machine_input: str | list[Char]):
+    __slots__ = ()
+
+    def encode_input(self, machine_input: str | list[Char]) -> array:
         # convert char list to str
-        if type(machine_input) == list[Char]:
+        if isinstance(machine_input, list):
             machine_input = multichars_to_str(machine_input)
         else:
             machine_input = str_to_multistr(machine_input)
-        # put input on tape in between and initialize head and state
+        # put input on tape in between start and blank
         if len(machine_input) >= 1:
-            self.chars = str_to_multichars(f"S|{machine_input}|_")
-        else:
-            self.chars = str_to_multichars(f"S|_")
+            return self.symbols.encode(str_to_multichars(f"S|{machine_input}|_"))
+        return self.symbols.encode(str_to_multichars(f"S|_"))
 
     def output(self) -> str:
         result = multichars_to_str(self.chars)
@@ -89,8 +200,6 @@ class MultiCharTape(Tape):
     def __repr__(self) -> str:
         # S11|11|0|11_
         #     ^
-        print(self.head)
-        print(self.read())
         if self.head == 0:
             head_char_pos = 0
         else:
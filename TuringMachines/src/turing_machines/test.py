@@ -1,13 +1,15 @@
 from __future__ import annotations
 
 import argparse
+import os
+import pickle
+import shutil
+import tempfile
 from collections.abc import Callable
+from functools import cache
+from pathlib import Path
 
-import turing_machines.chars
-import turing_machines.compress
-import turing_machines.tape
-import turing_machines.tm
-import turing_machines.transitions
+from turing_machines import chars, compress, tape, tm, transitions
 
 
 def test_action(test_function: Callable[[], None]):
@@ -29,6 +31,41 @@ class test_action_class(argparse.Action):
         parser.exit()
 
 
+@cache
+def load_tm(filename: str) -> tm.TuringMachine:
+    """Reads every TM only once, no matter how many tests use it (runs don't change the TM itself)."""
+
+    return tm.TuringMachine.from_file(filename)
+
+
+def task1_words(n: int) -> list[str]:
+    """Words around 0^n 1^n 0^n. Only the first one should be accepted by task1."""
+
+    return [
+        # 010
+        "0" * n + "1" * n + "0" * n,
+        # 0100, 0110, 0010
+        "0" * n + "1" * n + "0" * (n + 1),
+        "0" * n + "1" * (n + 1) + "0" * n,
+        "0" * (n + 1) + "1" * n + "0" * n,
+        # 01100, 00100, 00110
+        "0" * n + "1" * (n + 1) + "0" * (n + 1),
+        "0" * (n + 1) + "1" * n + "0" * (n + 1),
+        "0" * (n + 1) + "1" * (n + 1) + "0" * n
+    ]
+
+
+def addition_words(n_numbers: int) -> list[tuple[str, str]]:
+    """Inputs x$y for task2 (with x, y < `n_numbers`) and their expected results."""
+
+    return [(f"{bin(x)[2:]}${bin(y)[2:]}", bin(x + y)[2:]) for x in range(n_numbers) for y in range(n_numbers)]
+
+
+# the words are the same for every test, so build them only once
+TASK1_WORDS = [task1_words(n) for n in range(20)]
+ADDITION_WORDS = addition_words(20)
+
+
 def test_turing_machines():
     """Tests my implemented Turing Machines."""
 
@@ -44,46 +81,79 @@ def test_turing_machines():
     fun: transitions.TransitionFunction = transitions.TransitionFunction.from_file("machines/tm4.txt")
     assert fun.get(0, ['0']) == (0, [('1', transitions.Directions.R)])
 
-    tm5: tm.TuringMachine = tm.TuringMachine.from_file("machines/tm5.txt")
+    test_transitions_cache()
+
+    tm5: tm.TuringMachine = load_tm("machines/tm5.txt")
     assert tm5.result("0100$1101") == "1001"
+    # logging every 0th snapshot makes no sense
+    try:
+        tm.TuringMachine(tm5.transition_function, log_every=0)
+        assert False, "log_every = 0 was accepted."
+    except ValueError:
+        pass
 
     # test Turing Machines that were part of the task
     # tm_task1 should accept 0^n 1^n 0^n
-    tm_task1: tm.TuringMachine = tm.TuringMachine.from_file("machines/task1.txt")
-    for n in range(20):
-        # 010
-        word = "0" * n + "1" * n + "0" * n
-        assert tm_task1.accepts(word), f"Task 1 failed: {word} not accepted."
-        # 0100, 0110, 0010
-        word = "0" * n + "1" * n + "0" * (n + 1)
-        assert tm_task1.rejects(word), f"Task 1 failed: {word} not rejected."
-        word = "0" * n + "1" * (n + 1) + "0" * n
-        assert tm_task1.rejects(word), f"Task 1 failed: {word} not rejected."
-        word = "0" * (n + 1) + "1" * n + "0" * n
-        assert tm_task1.rejects(word), f"Task 1 failed: {word} not rejected."
-        # 01100, 00100, 00110
-        word = "0" * n + "1" * (n + 1) + "0" * (n + 1)
-        assert tm_task1.rejects(word), f"Task 1 failed: {word} not rejected."
-        word = "0" * (n + 1) + "1" * n + "0" * (n + 1)
-        assert tm_task1.rejects(word), f"Task 1 failed: {word} not rejected."
-        word = "0" * (n + 1) + "1" * (n + 1) + "0" * n
-        assert tm_task1.rejects(word), f"Task 1 failed: {word} not rejected."
+    tm_task1: tm.TuringMachine = load_tm("machines/task1.txt")
+    for accepted_word, *rejected_words in TASK1_WORDS:
+        assert tm_task1.accepts(accepted_word), f"Task 1 failed: {accepted_word} not accepted."
+        for word in rejected_words:
+            assert tm_task1.rejects(word), f"Task 1 failed: {word} not rejected."
     # tm_task2 should add 2 binary numbers
-    tm_task2a: tm.TuringMachine = tm.TuringMachine.from_file("machines/task2a.txt")
-    tm_task2b: tm.TuringMachine = tm.TuringMachine.from_file("machines/task2b.txt")
-    n_numbers_tested = 20
-    for x in range(n_numbers_tested):
-        for y in range(n_numbers_tested):
-            word = f"{bin(x)[2:]}${bin(y)[2:]}"
-            expected_result = bin(x + y)[2:]
-            result_2a = tm_task2a.result(word)
-            assert result_2a == expected_result, f"Task 2a failed: input = {word}, result = {result_2a}, expected = {expected_result}"
-            result_2b = tm_task2b.result(word)
-            assert result_2b == expected_result, f"Task 2b failed: input = {word}, result = {result_2b}, expected = {expected_result}"
+    tm_task2a: tm.TuringMachine = load_tm("machines/task2a.txt")
+    tm_task2b: tm.TuringMachine = load_tm("machines/task2b.txt")
+    for word, expected_result in ADDITION_WORDS:
+        result_2a = tm_task2a.result(word)
+        assert result_2a == expected_result, f"Task 2a failed: input = {word}, result = {result_2a}, expected = {expected_result}"
+        result_2b = tm_task2b.result(word)
+        assert result_2b == expected_result, f"Task 2b failed: input = {word}, result = {result_2b}, expected = {expected_result}"
 
     print("Turing Machines test: all tests passed.")
 
 
+def test_transitions_cache():
+    """Tests that parsed transition functions are cached in the user's cache directory (if asked to) and re-parsed when the file changes."""
+
+    old_cache_home = os.environ.get("XDG_CACHE_HOME")
+    with tempfile.TemporaryDirectory() as cache_home, tempfile.TemporaryDirectory() as machines_dir:
+        os.environ["XDG_CACHE_HOME"] = cache_home
+        try:
+            filename = shutil.copy("machines/tm4.txt", machines_dir)
+            cache_file = transitions.cache_path(filename)
+            # nothing is cached unless we ask for it
+            transitions.TransitionFunction.from_file(filename)
+            assert not cache_file.exists(), f"Transitions cache failed: {cache_file} was written without use_cache."
+            # first read writes the cache
+            fun = transitions.TransitionFunction.from_file(filename, use_cache=True)
+            assert fun.get(0, ['0']) == (0, [('1', transitions.Directions.R)])
+            assert cache_file.is_file(), f"Transitions cache failed: {cache_file} was not written."
+            assert Path(cache_file).is_relative_to(cache_home), f"Transitions cache failed: {cache_file} is not in {cache_home}."
+            assert os.listdir(machines_dir) == ["tm4.txt"], f"Transitions cache failed: wrote into {machines_dir}."
+            # as long as the file doesn't change, the second read comes from the cache
+            with open(cache_file, 'wb') as f:
+                f.write(transitions.cache_key(filename) + pickle.dumps("cached"))
+            assert transitions.TransitionFunction.from_file(filename, use_cache=True) == "cached", "Transitions cache failed: cache was not read."
+            # editing the file invalidates the cache (same size, so only the modification time changes)
+            stat = os.stat(filename)
+            with open(filename, 'r') as f:
+                content = f.read()
+            with open(filename, 'w') as f:
+                f.write(content.replace("0,0,0,1,R", "0,0,0,0,L"))
+            os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+            fun = transitions.TransitionFunction.from_file(filename, use_cache=True)
+            assert fun.get(0, ['0']) == (0, [('0', transitions.Directions.L)]), "Transitions cache failed: edited file was not parsed again."
+            # a broken cache is just ignored
+            with open(cache_file, 'wb') as f:
+                f.write(transitions.cache_key(filename) + b"not a pickle")
+            fun = transitions.TransitionFunction.from_file(filename, use_cache=True)
+            assert fun.get(0, ['0']) == (0, [('0', transitions.Directions.L)]), "Transitions cache failed: broken cache was not ignored."
+        finally:
+            if old_cache_home is None:
+                del os.environ["XDG_CACHE_HOME"]
+            else:
+                os.environ["XDG_CACHE_HOME"] = old_cache_home
+
+
 def same_output(tm1: tm.TuringMachine, tm2: tm.TuringMachine, word: str) -> bool:
     # if they're both end states, compare them
     if transitions.is_endstate(tm1.output()) and transitions.is_endstate(tm2.output()):
@@ -100,7 +170,7 @@ def test_compression():
     """Tests the Turing Machine compression."""
 
     # test compression of the copy machine
-    tm_copy = tm.TuringMachine.from_file("machines/copy.txt")
+    tm_copy = load_tm("machines/copy.txt")
     print("Compressing copy.")
     tm_copy_compressed = tm.TuringMachine(compress.compress(tm_copy.transition_function), tape_cls=tape.MultiCharTape)
     print("Testing copy.")
@@ -112,43 +182,46 @@ def test_compression():
         assert same_output(tm_copy, tm_copy_compressed, word), f"Copy compression failed: input = {word}, normal result = {tm_copy.output()}, compressed_result = {tm_copy_compressed.output()}"
 
     # test compression of task 1
-    tm_task1 = tm.TuringMachine.from_file("machines/task1.txt")
+    tm_task1 = load_tm("machines/task1.txt")
     print("Compressing task1.")
     tm_task1_compressed = tm.TuringMachine(compress.compress(tm_task1.transition_function), tape_cls=tape.MultiCharTape)
     print("Testing task1.")
-    for n in range(10):
-        words = [
-            # 010
-            "0" * n + "1" * n + "0" * n,
-            # 0100, 0110, 0010
-            "0" * n + "1" * n + "0" * (n + 1),
-            "0" * n + "1" * (n + 1) + "0" * n,
-            "0" * (n + 1) + "1" * n + "0" * n,
-            # 01100, 00100, 00110
-            "0" * n + "1" * (n + 1) + "0" * (n + 1),
-            "0" * (n + 1) + "1" * n + "0" * (n + 1),
-            "0" * (n + 1) + "1" * (n + 1) + "0" * n
-        ]
+    for words in TASK1_WORDS[:10]:
         for word in words:
             tm_task1.run(word)
             tm_task1_compressed.run(word)
             assert same_output(tm_task1, tm_task1_compressed, word), f"Task 1 compression failed: input = {word}, normal result = {tm_task1.output()}, compressed_result = {tm_task1_compressed.output()}"
 
     # test compression of task 2a
-    tm_task2a = tm.TuringMachine.from_file("machines/task2a.txt")
+    tm_task2a = load_tm("machines/task2a.txt")
     print("Compressing task2a.")
     tm_task2a_compressed = tm.TuringMachine(compress.compress(tm_task2a.transition_function), tape_cls=tape.MultiCharTape)
     print("Testing task2a.")
-    n_numbers_tested = 10
-    for x in range(n_numbers_tested):
-        for y in range(n_numbers_tested):
-            word = f"{bin(x)[2:]}${bin(y)[2:]}"
-            tm_task2a.run(word)
-            tm_task2a_compressed.run(word)
-            assert same_output(tm_task2a, tm_task2a_compressed, word), f"Task 2a compression failed: input = {word}, normal result = {tm_task2a.output()}, compressed_result = {tm_task2a_compressed.output()}"
+    for word, _ in addition_words(10):
+        tm_task2a.run(word)
+        tm_task2a_compressed.run(word)
+        assert same_output(tm_task2a, tm_task2a_compressed, word), f"Task 2a compression failed: input = {word}, normal result = {tm_task2a.output()}, compressed_result = {tm_task2a_compressed.output()}"
 
     print("Compression test: all tests passed.")
 
 
+def test_runtime():
+    """Tests measuring runtimes in multiple processes."""
+
+    # runtime imports numpy, which the other tests don't need
+    from turing_machines import runtime
+
+    # running another TM first must not change the ids of the chars of this one (in this process or another one)
+    tm_multichars = tm.TuringMachine.from_file("machines/multichars.txt", tape_cls=tape.MultiCharTape)
+    tm_multichars.run("11|0|11|0|0")
+    tm_task1 = tm.TuringMachine.from_file("machines/task1.txt")
+    words = [word for words in TASK1_WORDS[:10] for word in words]
+    serial_times = runtime.measure(tm_task1, words)
+    parallel_times = runtime.measure(tm_task1, words, workers=2)
+    assert parallel_times == serial_times, f"Measuring in multiple processes failed: serial = {serial_times}, parallel = {parallel_times}"
+
+    print("Runtime test: all tests passed.")
+
+
 if __name__ == "__main__":
     test_turing_machines()
@@ -1,11 +1,13 @@
 import os
 import curses
 import argparse
+from collections.abc import Iterable
 from enum import Enum
+from operator import getitem
 from typing import Generic, Self, Type, TypeVar
 
 import turing_machines.test as test
-from turing_machines.tape import MultiCharTape, SingleCharTape, Tape
+from turing_machines.tape import START_ID, MultiCharTape, SingleCharTape, SymbolTable, Tape, grow
 from turing_machines.display import ScrollableDisplay, Window
 from turing_machines.transitions import TransitionFunction, EndStates, Char, Directions, is_endstate
 
@@ -19,67 +21,288 @@ class AnimationDirections(Enum):
 
 ANIMATION_DIRECTION_STRINGS = [state.value for state in AnimationDirections]
 
+# how far a head moves in each direction
+HEAD_DELTAS = {
+    Directions.L: -1,
+    Directions.N: 0,
+    Directions.R: 1
+}
+
+# transitions on symbol ids: (state, *ids read) -> (state, ids written, head deltas)
+# the key is one flat tuple, so it's built and hashed without a nested tuple
+CompiledTransitions = dict[tuple[int, ...], tuple[int | EndStates, tuple[int], tuple[int]]]
+
+
+def compile_transitions(transition_function: TransitionFunction, symbols: SymbolTable) -> CompiledTransitions:
+    """Translates the transitions to the symbol ids of the table, so a run can work on the tape cells directly."""
+
+    symbol_id = symbols.id
+    return {
+        (state_in, *[symbol_id(char) for char in chars_in]): (
+            state_out,
+            tuple([symbol_id(char) for char, _ in chars_and_dirs_out]),
+            tuple([HEAD_DELTAS[direction] for _, direction in chars_and_dirs_out])
+        ) for (state_in, chars_in), (state_out, chars_and_dirs_out) in transition_function._transitions.items()
+    }
+
+
+# end states are negative in the table, so the run loop only has to compare ints
+END_STATE_CODES = {
+    EndStates.ACCEPT: -1,
+    EndStates.REJECT: -2,
+    EndStates.HALT: -3
+}
+CODE_END_STATES = {code: end_state for end_state, code in END_STATE_CODES.items()}
+# marks transitions that would overwrite the start symbol
+START_OVERWRITE = ()
+
+# transitions of a 1-tape TM as a table: [state][id read] -> (state, id written, head delta), None if we reject
+TransitionTable = list[list[tuple[int, int, int] | None]]
+
+
+def compile_transition_table(compiled_transitions: CompiledTransitions, n_symbols: int) -> TransitionTable:
+    """Lays out the compiled transitions of a 1-tape TM as a table indexed by state and symbol id, so a step doesn't need to hash anything."""
+
+    n_rows = max((state_in for state_in, _ in compiled_transitions), default=-1) + 1
+    # symbols that are registered later are not in the table (the TM doesn't know them anyway)
+    table: TransitionTable = [[None] * n_symbols for _ in range(n_rows)]
+    for (state_in, id_in), (state_out, (id_out,), (delta,)) in compiled_transitions.items():
+        # we know in advance which transitions would overwrite the start symbol
+        if id_in == START_ID and id_out != START_ID:
+            table[state_in][id_in] = START_OVERWRITE
+        else:
+            table[state_in][id_in] = (END_STATE_CODES.get(state_out, state_out), id_out, delta)
+    return table
+
+
+# transitions of a k-tape TM: (state, *ids read) -> (state, changes), with one change (tape, id written, head delta)
+# for every tape that is actually written or moved
+TapeChanges = dict[tuple[int, ...], tuple[int, tuple[tuple[int, int, int], ...]]]
+
+
+def compile_tape_changes(compiled_transitions: CompiledTransitions) -> TapeChanges:
+    """Drops the tapes a transition leaves as they are (same id, no move), so a step only touches the tapes that change."""
+
+    tape_changes: TapeChanges = {}
+    for key, (state_out, ids_out, deltas) in compiled_transitions.items():
+        ids_in = key[1:]
+        # we know in advance which transitions would overwrite the start symbol
+        if any(id_in == START_ID and id_out != START_ID for id_in, id_out in zip(ids_in, ids_out)):
+            tape_changes[key] = START_OVERWRITE
+            continue
+        changes = tuple([
+            (i, id_out, delta)
+            for i, (id_in, id_out, delta) in enumerate(zip(ids_in, ids_out, deltas))
+            if id_out != id_in or delta != 0
+        ])
+        tape_changes[key] = (END_STATE_CODES.get(state_out, state_out), changes)
+    return tape_changes
+
 
 class TuringMachine:
-    def __init__(self, transition_function: TransitionFunction, logging=False, show_transitions=False, tape_cls: Type[Tape] = SingleCharTape) -> None:
+    def __init__(self, transition_function: TransitionFunction, logging=False, show_transitions=False, tape_cls: Type[Tape] = SingleCharTape, log_every=1) -> None:
         # TODO: do sth with this? (i'm not using n_states anywhere)
         self.n_states = transition_function.n_states
         self.n_tapes = transition_function.n_tapes
         self.transition_function = transition_function
         self.logging = logging
         self.show_transitions = show_transitions
+        # printing a snapshot is O(tape length), so long runs can log only every n-th one
+        if log_every < 1:
+            raise ValueError(f"Can only log every n-th snapshot for n >= 1, not n = {log_every}.")
+        self.log_every = log_every
         # tape can be of different sub classes
         self.tape_cls = tape_cls
-        # initialized when TM is run
-        self.tapes: list[Tape]
+        # the ids of the chars on the tapes and in the compiled transitions (only this TM uses them)
+        self.symbols = SymbolTable()
+        # every tape is its own object (the runs reset them instead of building new ones)
+        self.tapes: list[Tape] = self.__new_tapes()
         self.state: int | EndStates
         self.time: int
-
-    def __read(self) -> list[Char]:
-        return [tape.read() for tape in self.tapes]
-
-    def __write(self, chars: list[Char]):
-        for tape, char in zip(self.tapes, chars):
-            tape.write(char)
-
-    def __move(self, directions: list[Directions]):
-        for tape, direction in zip(self.tapes, directions):
-            tape.move(direction)
+        # built on the first run
+        self.compiled_transitions: CompiledTransitions | None = None
+        self.transition_table: TransitionTable | None = None
+        self.tape_changes: TapeChanges | None = None
+
+    def __getstate__(self) -> dict:
+        # the compiled transitions are about as big as the transition function itself, another process can build them again
+        state = self.__dict__.copy()
+        state['compiled_transitions'] = None
+        state['transition_table'] = None
+        state['tape_changes'] = None
+        return state
+
+    def __new_tapes(self) -> list[Tape]:
+        return [self.tape_cls(symbols=self.symbols) for _ in range(self.n_tapes)]
+
+    def __read(self) -> tuple[Char]:
+        # a tuple can be used as the key of the transition function as it is
+        return tuple([tape.read() for tape in self.tapes])
 
     def step(self):
         """Does one (1) step for the TM."""
 
+        if self.n_tapes == 1:
+            self.__step_single()
+            return
         self.time += 1
         # find out what needs to happen
         chars = self.__read()
         next_state, chars_and_directions = self.transition_function.get(self.state, chars)
-        written_chars = [char for char, _ in chars_and_directions]
-        directions = [direction for _, direction in chars_and_directions]
-        # make it happen
-        self.__write(written_chars)
-        self.__move(directions)
+        # make it happen (the tapes don't depend on each other, so do one tape at a time)
+        for tape, (written_char, direction) in zip(self.tapes, chars_and_directions):
+            tape.write(written_char)
+            tape.move(direction)
+        self.state = next_state
+
+    def __step_single(self):
+        """Same as `step`, but for 1-tape TMs (no lists of chars and directions)."""
+
+        self.time += 1
+        tape = self.tapes[0]
+        next_state, [(written_char, direction)] = self.transition_function.get(self.state, (tape.read(),))
+        tape.write(written_char)
+        tape.move(direction)
         self.state = next_state
 
+    def __run_compiled(self):
+        """Does steps until the TM is in an end state, same as calling step() repeatedly, but on the tape cells directly."""
+
+        if self.compiled_transitions is None:
+            self.compiled_transitions = compile_transitions(self.transition_function, self.symbols)
+        # the transitions might write ids that don't fit in a byte
+        if self.symbols.typecode() == 'I':
+            for tape in self.tapes:
+                tape.widen()
+        if self.n_tapes == 1:
+            self.__run_table()
+            return
+        if self.tape_changes is None:
+            self.tape_changes = compile_tape_changes(self.compiled_transitions)
+        lookup_transition = self.tape_changes.get
+        # keep everything in locals while running
+        cells = [tape.cells for tape in self.tapes]
+        heads = [tape.head for tape in self.tapes]
+        lengths = [tape.length for tape in self.tapes]
+        state = self.state
+        time = self.time
+        try:
+            # only the end states are negative
+            while state >= 0:
+                time += 1
+                transition = lookup_transition((state, *map(getitem, cells, heads)))
+                if not transition:
+                    # that should not happen, but it will if your turing machine is weird
+                    if transition == START_OVERWRITE:
+                        raise RuntimeError("Start symbol can't be overwritten.")
+                    # if we didn't specify this combination, we reject (without writing or moving)
+                    state = END_STATE_CODES[EndStates.REJECT]
+                    break
+                state, changes = transition
+                # tapes that stay the same are not in the changes
+                for i, written_id, delta in changes:
+                    tape_cells = cells[i]
+                    head = heads[i]
+                    tape_cells[head] = written_id
+                    if not delta:
+                        continue
+                    head += delta
+                    # expand tape if necessary (we don't actually have infinite memory)
+                    if head >= lengths[i]:
+                        lengths[i] = head + 1
+                        if head >= len(tape_cells):
+                            grow(tape_cells)
+                    # that should not happen, but it will if your turing machine is weird
+                    if head < 0:
+                        raise IndexError("Head can't go to the left of the start of the tape.")
+                    heads[i] = head
+        finally:
+            # write everything back, so the TM looks like it did the steps one by one
+            for tape, head, length in zip(self.tapes, heads, lengths):
+                tape.head = head
+                tape.length = length
+            self.state = CODE_END_STATES.get(state, state)
+            self.time = time
+
+    def __run_table(self):
+        """Same as `__run_compiled`, but for 1-tape TMs (looks up transitions in a table instead of a dict)."""
+
+        if self.transition_table is None:
+            self.transition_table = compile_transition_table(self.compiled_transitions, len(self.symbols.symbols))
+        table = self.transition_table
+        # keep everything in locals while running
+        tape = self.tapes[0]
+        cells = tape.cells
+        head = tape.head
+        length = tape.length
+        state = self.state
+        time = self.time
+        try:
+            # only the end states are negative
+            while state >= 0:
+                time += 1
+                try:
+                    transition = table[state][cells[head]]
+                except IndexError:
+                    # a symbol (or state) the TM doesn't know
+                    transition = None
+                if not transition:
+                    # that should not happen, but it will if your turing machine is weird
+                    if transition == START_OVERWRITE:
+                        raise RuntimeError("Start symbol can't be overwritten.")
+                    # if we didn't specify this combination, we reject (without writing or moving)
+                    state = END_STATE_CODES[EndStates.REJECT]
+                    break
+                # write directly onto the tape
+                state, cells[head], delta = transition
+                head += delta
+                # expand tape if necessary (we don't actually have infinite memory)
+                if head >= length:
+                    length = head + 1
+                    if head >= len(cells):
+                        grow(cells)
+                # that should not happen, but it will if your turing machine is weird
+                if head < 0:
+                    raise IndexError("Head can't go to the left of the start of the tape.")
+        finally:
+            # write everything back, so the TM looks like it did the steps one by one
+            tape.head = head
+            tape.length = length
+            self.state = CODE_END_STATES.get(state, state)
+            self.time = time
+
+    def __start(self, input: str | list[Char]):
+        """Puts the TM in its starting configuration for the input."""
+
+        self.state = 0
+        self.time = 0
+        # only build new tapes if somebody changed the kind of tape (or the tapes) since the last run
+        if any(type(tape) is not self.tape_cls or tape.symbols is not self.symbols for tape in self.tapes):
+            self.tapes = self.__new_tapes()
+        # first tape is input tape, the others start empty
+        self.tapes[0].reset(input)
+        for tape in self.tapes[1:]:
+            tape.reset()
+
     def run(self, input: str | list[Char]) -> EndStates:
         """Runs the TM until it is in an end state."""
 
         # if logging is enabled and we show transitions, show them now (at the start)
         if self.logging and self.show_transitions:
-            print(f"{self.transition_function}\n")
-        self.state = 0
-        self.time = 0
-        # init tapes
-        self.tapes = [self.tape_cls() for _ in range(self.n_tapes)]
-        # first tape is input tape
-        self.tapes[0] = self.tape_cls(input)
+            print(f"{self.transition_function.pretty()}\n")
+        self.__start(input)
         # log starting state
         if self.logging:
             print(self)
+        # without logging, we don't need to stop after every step
+        if not self.logging:
+            self.__run_compiled()
+            return self.state
         # run until in end state
         while not is_endstate(self.state):
             self.step()
-            # log current state
-            if self.logging:
+            # log current state (always log the last one)
+            if self.time % self.log_every == 0 or is_endstate(self.state):
                 print(self)
         return self.state
 
@@ -118,6 +341,11 @@ class TuringMachine:
         self.run(input)
         return self.time
 
+    def runtimes(self, inputs: Iterable[str | list[Char]]) -> list[int]:
+        """Runs the TM on every input and returns the number of steps needed for each of them."""
+
+        return [self.runtime(x) for x in inputs]
+
     ################################################################
     # animation stuff
     ################################################################
@@ -125,12 +353,7 @@ class TuringMachine:
     def __run_animation(self, input: str | list[Char], window: Window) -> EndStates:
         """Runs and animates the TM in a curses window."""
 
-        self.state = 0
-        self.time = 0
-        # init tapes
-        self.tapes = [self.tape_cls() for _ in range(self.n_tapes)]
-        # first tape is input tape
-        self.tapes[0] = self.tape_cls(input)
+        self.__start(input)
 
         # animation stuff
         # snapshots of the TM at any given time (just string representations)
@@ -139,13 +362,15 @@ class TuringMachine:
         snapshots.append(str(self))
         # cached result of the run of the TM
         result = None
+        # the transitions don't change, so only render them once (not on every key press)
+        transitions_str = self.transition_function.pretty() if self.show_transitions else ""
         # display first snapshot
         display = ScrollableDisplay(window)
         display.add("To leave animation, press Enter.\n")
         display.add(snapshots[current_snapshot] + "\n")
         # if we show transitions, show them below everything else
         if self.show_transitions:
-            display.add(str(self.transition_function))
+            display.add(transitions_str)
         display.update()
 
         # animate
@@ -189,12 +414,13 @@ class TuringMachine:
                 display.add(f"Result: {result}\n")
             # if we show transitions, show them below everything else
             if self.show_transitions:
-                display.add(str(self.transition_function))
+                display.add(transitions_str)
             display.update()
 
         # if an endstate wasn't reached, just keep running until the end
-        while not is_endstate(self.state):
-            self.step()
+        # (nobody watches anymore, so we don't need to stop after every step)
+        if not is_endstate(self.state):
+            self.__run_compiled()
         return self.state
 
     def animate(self, input: str | list[Char]) -> EndStates:
@@ -216,9 +442,18 @@ class TuringMachine:
         return f"time: {self.time},\tstate: {self.state}\ntapes:\n{tape_strings}"
 
     @classmethod
-    def from_file(cls, filename: str, **kwargs) -> Self:
-        fun: TransitionFunction = TransitionFunction.from_file(filename)
-        return TuringMachine(fun, **kwargs)
+    def from_file(cls, filename: str, use_cache=False, **kwargs) -> Self:
+        fun: TransitionFunction = TransitionFunction.from_file(filename, use_cache=use_cache)
+        return cls(fun, **kwargs)
+
+
+def positive_int(value: str) -> int:
+    """Argument type for ints >= 1."""
+
+    n = int(value)
+    if n < 1:
+        raise argparse.ArgumentTypeError(f"has to be at least 1, not {n}")
+    return n
 
 
 def main():
@@ -236,6 +471,10 @@ def main():
     parser.add_argument("-l", "--logging",
                         action='store_true',
                         help="Logs the snapshots of the Turing Machine.")
+    parser.add_argument("-e", "--logevery",
+                        type=positive_int,
+                        default=1,
+                        help="Only log every n-th snapshot (the last one is always logged).")
     parser.add_argument("-s", "--showtransitions",
                         action='store_true',
                         help="Shows the transition table with the animation or log (logging must be enabled for the latter).")
@@ -245,6 +484,9 @@ def main():
     parser.add_argument("-m", "--multichars",
                         action='store_true',
                         help="Enable ability to have multiple chars in one tape cell.")
+    parser.add_argument("-c", "--cache",
+                        action='store_true',
+                        help="Cache the parsed Turing Machine in the user's cache directory, so it loads faster next time.")
     parser.add_argument("--test",
                         action=test.test_action(test.test_turing_machines),
                         help="Tests the implementation and the Turing Machines that were part of the task (no other arguments needed).")
@@ -256,7 +498,7 @@ def main():
     else:
         tape_cls = SingleCharTape
     # read turing machine
-    tm: TuringMachine = TuringMachine.from_file(args.filename, logging=args.logging, show_transitions=args.showtransitions, tape_cls=tape_cls)
+    tm: TuringMachine = TuringMachine.from_file(args.filename, logging=args.logging, show_transitions=args.showtransitions, tape_cls=tape_cls, log_every=args.logevery, use_cache=args.cache)
     # read machine input
     if args.fileinput:
         with open(args.input, 'r') as f:
@@ -1,7 +1,9 @@
+import hashlib
 import os
-import re
+import pickle
+from collections.abc import Iterator, Sequence
 from enum import Enum
-from io import TextIOWrapper
+from pathlib import Path
 from typing import Self
 
 from tabulate import tabulate
@@ -16,6 +18,8 @@ class EndStates(Enum):
 
 
 END_STATE_CHARS = [state.value for state in EndStates]
+# looking them up by value is faster than calling EndStates(...)
+END_STATES_BY_CHAR = {state.value: state for state in EndStates}
 
 
 class Directions(Enum):
@@ -24,17 +28,26 @@ class Directions(Enum):
     R = 'R'
 
 
+DIRECTIONS_BY_CHAR = {direction.value: direction for direction in Directions}
+
 SPECIAL_CHARS = ['S', '_']
 
+# if asked to, parsed transition functions are cached in this directory of the user's cache directory
+# (never next to the machine files, so reading a machine doesn't unpickle anything that came with it)
+CACHE_DIR = "turing_machines"
+# bump this whenever the pickled TransitionFunction changes
+CACHE_VERSION = 2
+
 
 # input to transition function: state and character
 TransitionIn = tuple[int, list[Char]]
 # output of transtion function: state (+ end states), character (only writeable ones), direction
-TransitionOut = tuple[int | EndStates, list[tuple[Char, Directions]]]
+# (a list when parsed from a file, a tuple when built by compress, so it can be shared between transitions)
+TransitionOut = tuple[int | EndStates, Sequence[tuple[Char, Directions]]]
 
 
 def is_endstate(state: int | EndStates):
-    return type(state) == EndStates
+    return type(state) is EndStates
 
 
 def to_key(trans_in: TransitionIn):
@@ -43,14 +56,38 @@ def to_key(trans_in: TransitionIn):
     return (state, chars)
 
 
+# deletes all whitespace with str.translate (no regex needed)
+WHITESPACE_TABLE = str.maketrans("", "", " \t\r\n\x0b\x0c")
+
+
 def sanitize(line: str):
-    return re.sub(r"\s+", "", line)
+    return line.translate(WHITESPACE_TABLE)
+
+
+def skip_comments(lines: Iterator[str]) -> str:
+    return next(line for line in lines if not line.startswith('#'))
+
+
+def cache_dir() -> Path:
+    """Where parsed transition functions are cached ($XDG_CACHE_HOME/turing_machines or ~/.cache/turing_machines)."""
+
+    cache_home = os.environ.get("XDG_CACHE_HOME") or Path.home() / ".cache"
+    return Path(cache_home) / CACHE_DIR
 
 
-def skip_comments(f: TextIOWrapper):
-    while line := f.readline():
-        if line[0] != '#':
-            return line
+def cache_path(filename: str) -> Path:
+    """Where the parsed version of the file is cached (machines/task1.txt -> task1.txt-<hash of the absolute path>.pickle)."""
+
+    path = Path(filename).resolve()
+    path_hash = hashlib.sha256(str(path).encode()).hexdigest()[:16]
+    return cache_dir() / f"{path.name}-{path_hash}.pickle"
+
+
+def cache_key(filename: str) -> bytes:
+    """First line of the cache file, changes whenever the file (or the cache format) changes."""
+
+    stat = os.stat(filename)
+    return f"{CACHE_VERSION} {stat.st_mtime_ns} {stat.st_size} {Path(filename).resolve()}\n".encode()
 
 
 def transition_to_str(t_in: TransitionIn, t_out: TransitionOut) -> str:
@@ -69,15 +106,20 @@ class TransitionFunction:
         self._transitions: dict[TransitionIn, TransitionOut] = {}
 
     def get(self, state: int, chars: list[Char]) -> TransitionOut:
-        # if we didn't specify this combination, we reject
-        trans_in: TransitionIn = (state, chars)
-        key = to_key(trans_in)
-        if key not in self._transitions:
-            return (EndStates.REJECT, zip(chars, [Directions.N] * self.n_tapes))
+        trans_out = self._transitions.get((state, tuple(chars)))
+        # if we didn't specify this combination, we reject (without writing or moving)
+        if trans_out is None:
+            return (EndStates.REJECT, [(char, Directions.N) for char in chars])
         # otherwise just return the matching transition
-        return self._transitions[key]
+        return trans_out
 
     def __repr__(self) -> str:
+        # cheap on purpose, this ends up in error messages and debuggers (use pretty() for the table)
+        return f"TransitionFunction(n_states={self.n_states}, n_tapes={self.n_tapes}, n_transitions={len(self._transitions)})"
+
+    def pretty(self) -> str:
+        """Returns all transitions as a table."""
+
         return tabulate([[
             # state in
             trans_in[0],
@@ -112,49 +154,85 @@ class TransitionFunction:
             f.write(encoded)
 
     @classmethod
-    def from_file(cls, filename: str) -> Self:
+    def from_file(cls, filename: str, use_cache=False) -> Self:
+        """Reads the encoded transition function from a file. With `use_cache`, the parsed function is cached until the file changes."""
+
+        if not use_cache:
+            return cls._parse_file(filename)
+        key = cache_key(filename)
+        cache_file = cache_path(filename)
+        # try the cache first
+        try:
+            # the key is a plain line in front of the pickle, so nothing is unpickled unless it matches
+            with open(cache_file, 'rb') as f:
+                if f.readline() == key:
+                    return pickle.loads(f.read())
+        except Exception:
+            # missing, broken or outdated (e.g. a pickled class was renamed), we just parse the file again
+            pass
+        fun = cls._parse_file(filename)
+        # we don't care if we can't write the cache
+        try:
+            cache_file.parent.mkdir(parents=True, exist_ok=True)
+            # write it somewhere else first, so nobody ever reads half a cache file
+            tmp_file = cache_file.with_name(f"{cache_file.name}.{os.getpid()}.tmp")
+            with open(tmp_file, 'wb') as f:
+                f.write(key)
+                pickle.dump(fun, f, protocol=pickle.HIGHEST_PROTOCOL)
+            os.replace(tmp_file, cache_file)
+        except OSError:
+            pass
+        return fun
+
+    @classmethod
+    def _parse_file(cls, filename: str) -> Self:
+        # read the whole file at once, the lines are split in memory
         with open(filename, 'r') as f:
-            # read how the transition function is supposed to look
-            # ignore comments
-            firstline = skip_comments(f)
-            n_states, n_tapes, alphabet_size, n_lines = [int(c) for c in firstline.split(" ")]
-            # ignore comments
-            secondline = sanitize(skip_comments(f))
-            alphabet = secondline.split(",")
-            assert alphabet_size == len(alphabet), "Alphabet does not have promised size."
-            # read the transition function
-            fun = TransitionFunction(n_states, n_tapes, alphabet)
-            observed_lines = 0
-            observed_states: set[Char] = set()
-            while line := sanitize(f.readline()):
-                # skip comments
-                if line[0] == '#':
-                    continue
-                # add transition
-                trans_in, trans_out = TransitionFunction.parse_line(line, n_tapes)
-                fun._add(trans_in, trans_out)
-                # collect observed states, chars, ...
-                state_in, chars_in = trans_in
-                state_out, chars_dirs_out = trans_out
-                if not is_endstate(state_in):
-                    observed_states.add(state_in)
-                if not is_endstate(state_out):
-                    observed_states.add(state_out)
-                observed_lines += 1
-                # chars need to be in alphabet
-                for char in chars_in:
-                    assert char in alphabet or char in SPECIAL_CHARS, f"Observed char ({char}) not in alphabet ({alphabet})."
-                for char, _ in chars_dirs_out:
-                    assert char in alphabet or char in SPECIAL_CHARS, f"Observed char ({char}) not in alphabet ({alphabet})."
-            # assert that the transition function actually looks like it's supposed to look
-            assert n_lines == observed_lines, f"Observed line count ({observed_lines}) does not equal promised line count ({n_lines})."
-            assert n_states == len(observed_states), f"Observed state count ({observed_states}, {len(observed_states)} states) does not equal promised state count ({n_states})."
+            lines = iter(f.read().splitlines())
+        # read how the transition function is supposed to look
+        # ignore comments
+        firstline = skip_comments(lines)
+        n_states, n_tapes, alphabet_size, n_lines = [int(c) for c in firstline.split(" ")]
+        # ignore comments
+        secondline = sanitize(skip_comments(lines))
+        alphabet = secondline.split(",")
+        assert alphabet_size == len(alphabet), "Alphabet does not have promised size."
+        # read the transition function
+        fun = TransitionFunction(n_states, n_tapes, alphabet)
+        # hash the chars once instead of comparing them with every char in the alphabet
+        allowed_chars = set(alphabet) | set(SPECIAL_CHARS)
+        observed_lines = 0
+        observed_states: set[Char] = set()
+        for line in map(sanitize, lines):
+            # skip empty lines and comments
+            if not line or line[0] == '#':
+                continue
+            # add transition
+            trans_in, trans_out = TransitionFunction.parse_line(line, n_tapes, sanitized=True)
+            fun._add(trans_in, trans_out)
+            # collect observed states, chars, ...
+            state_in, chars_in = trans_in
+            state_out, chars_dirs_out = trans_out
+            # the input state is never an end state
+            observed_states.add(state_in)
+            if not is_endstate(state_out):
+                observed_states.add(state_out)
+            observed_lines += 1
+            # chars need to be in alphabet
+            for char in chars_in:
+                assert char in allowed_chars, f"Observed char ({char}) not in alphabet ({alphabet})."
+            for char, _ in chars_dirs_out:
+                assert char in allowed_chars, f"Observed char ({char}) not in alphabet ({alphabet})."
+        # assert that the transition function actually looks like it's supposed to look
+        assert n_lines == observed_lines, f"Observed line count ({observed_lines}) does not equal promised line count ({n_lines})."
+        assert n_states == len(observed_states), f"Observed state count ({observed_states}, {len(observed_states)} states) does not equal promised state count ({n_states})."
         return fun
 
     @classmethod
-    def parse_line(cls, line: str, n_tapes: int) -> tuple[TransitionIn, TransitionOut]:
-        # remove all whitespace and line breaks
-        line = re.sub(r"\s+", "", line)
+    def parse_line(cls, line: str, n_tapes: int, sanitized=False) -> tuple[TransitionIn, TransitionOut]:
+        # remove all whitespace and line breaks (unless the caller already did)
+        if not sanitized:
+            line = sanitize(line)
         # read entries and make sure it's the right amount
         entries = line.split(",")
         # 1 state_in, 1 state_out, n chars_in, n chars_out, n directions
@@ -166,10 +244,10 @@ class TransitionFunction:
         chars_in = entries[1:n_tapes + 1]
         # 1 state_out
         state_out = entries[n_tapes + 1]
-        state_out = int(state_out) if state_out not in END_STATE_CHARS else EndStates(state_out)
-        # n times char and directions
-        rest = entries[n_tapes + 2:]
-        chars_and_dirs_out = [(rest[2 * i], Directions(rest[2 * i + 1])) for i in range(n_tapes)]
+        end_state = END_STATES_BY_CHAR.get(state_out)
+        state_out = int(state_out) if end_state is None else end_state
+        # n times char and directions (indexed directly, no need to slice them out first)
+        chars_and_dirs_out = [(entries[i], DIRECTIONS_BY_CHAR[entries[i + 1]]) for i in range(n_tapes + 2, n_entries_expected, 2)]
         # build transition entry
         trans_in: TransitionIn = (state_in, chars_in)
         trans_out: TransitionOut = (state_out, chars_and_dirs_out)